@@ -3,9 +3,19 @@ AI-based traffic analyzer with ML anomaly detection
 """
 
 import numpy as np
-from collections import defaultdict
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime
 import hashlib
+from time import perf_counter_ns
+
+from flow_history import FlowHistoryStore
+from flow_table import FlowIndex
+from flow_stats import FEATURE_WINDOW, FEATURE_COUNT, window_features, burst_rate
+from feature_export import FlowFeatureWriter
+from model_artifact import load_model, save_model, training_stats
+from rule_engine import ScoringRules, severity_for
+from latency import StageLatency
 
 try:
     from sklearn.ensemble import IsolationForest
@@ -14,177 +24,340 @@ except ImportError:
     SKLEARN_AVAILABLE = False
     print("scikit-learn not installed. Run: pip3 install scikit-learn")
 
+class MLBatchScorer:
+    """Queues packet windows and scores them with one predict() per batch.
+
+    Each submitted flow window (its last FEATURE_WINDOW timestamps, sizes
+    and ports) is copied into preallocated arrays; at flush time features
+    for the whole batch come from one window_features() call, the same
+    code training uses. A batch is flushed as soon as it holds
+    ``batch_size`` windows, or once the oldest has waited ``max_latency``
+    seconds. Each flushed entry is handed to ``on_scored(context, is_anomaly)``.
+    """
+
+    def __init__(self, on_scored, batch_size=256, max_latency=0.005, latency=None):
+        self.on_scored = on_scored
+        self.latency = latency or StageLatency()
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.model = None
+        self._timestamps = np.zeros((batch_size, FEATURE_WINDOW), dtype=np.float64)
+        self._sizes = np.zeros((batch_size, FEATURE_WINDOW), dtype=np.uint32)
+        self._ports = np.zeros((batch_size, FEATURE_WINDOW), dtype=np.int32)
+        self._contexts = []
+        self._deadline = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self.running = True
+        self.batches_scored = 0
+        self.vectors_scored = 0
+        
+        self._timer_thread = threading.Thread(target=self._deadline_loop)
+        self._timer_thread.daemon = True
+        self._timer_thread.start()
+        
+    def submit(self, window, context):
+        """Queue one (timestamps, sizes, ports) window; flushes inline when the batch is full"""
+        timestamps, sizes, ports = window
+        with self._lock:
+            n = len(self._contexts)
+            self._timestamps[n] = timestamps
+            self._sizes[n] = sizes
+            self._ports[n] = ports
+            self._contexts.append(context)
+            if n == 0:
+                self._deadline = time.monotonic() + self.max_latency
+                self._wakeup.notify()
+            if n + 1 < self.batch_size:
+                return
+            batch = self._take_batch()
+        self._score(*batch)
+        
+    def flush(self):
+        """Score whatever is queued right now"""
+        with self._lock:
+            batch = self._take_batch()
+        self._score(*batch)
+        
+    def close(self):
+        """Stop the deadline thread after scoring anything still queued"""
+        self.running = False
+        with self._lock:
+            self._wakeup.notify()
+        self._timer_thread.join(timeout=1)
+        self.flush()
+        
+    def pending(self):
+        return len(self._contexts)
+        
+    def _take_batch(self):
+        """Detach the queued batch (caller holds the lock)"""
+        n = len(self._contexts)
+        window = (self._timestamps[:n].copy(), self._sizes[:n].copy(), self._ports[:n].copy())
+        contexts = self._contexts
+        self._contexts = []
+        self._deadline = None
+        return window, contexts
+        
+    def _score(self, window, contexts):
+        if not contexts:
+            return
+        model = self.model
+        if model is None:
+            anomalies = np.zeros(len(contexts), dtype=bool)
+        else:
+            timed = self.latency.enabled
+            if timed:
+                start = perf_counter_ns()
+            anomalies = model.predict(window_features(*window)) == -1
+            if timed:
+                self.latency.record("ml_predict_batch", start)
+        self.batches_scored += 1
+        self.vectors_scored += len(contexts)
+        for context, anomaly in zip(contexts, anomalies):
+            self.on_scored(context, bool(anomaly))
+
+    def _deadline_loop(self):
+        """Flush batches whose oldest vector has hit max_latency"""
+        while self.running:
+            with self._lock:
+                if self._deadline is None:
+                    self._wakeup.wait(timeout=0.5)
+                    continue
+                remaining = self._deadline - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(timeout=remaining)
+                    continue
+                batch = self._take_batch()
+            try:
+                self._score(*batch)
+            except Exception as e:
+                # Losing this thread would strand every later partial batch
+                print(f"[AI] Batch scoring failed ({len(batch[1])} packets): {e}")
+
+
 class AIAnalyzer:
-    def __init__(self, threshold=0.7):
+    def __init__(self, threshold=0.7, history_window=200, max_flows=10000,
+                 batch_size=0, batch_max_latency=0.005, on_result=None, idle_timeout=300,
+                 blocklist=None, known_bad=None, model_path=None, feature_export_dir=None,
+                 feature_rotate_seconds=3600, rules_path=None, rules_reload_interval=0,
+                 latency=None, flows=None):
         self.threshold = threshold
-        self.connection_history = defaultdict(list)
+        self.latency = latency or StageLatency()  # Sampled per-stage timings
+        # Prefix tries (ip_trie.PrefixTrie) checked against both endpoints
+        self.blocklist = blocklist
+        self.known_bad = known_bad
+        # Flow ids come from the monitor's FlowIndex when it is shared (the
+        # monitor has already counted each record, so records must come
+        # from that monitor); otherwise from our own
+        self.shared_flows = flows is not None
+        self.flows = flows if flows is not None else FlowIndex(max_flows, idle_timeout)
+        # History rows are the flow ids themselves, so the index's capacity
+        # and eviction are the history's too. Without batching, features are
+        # kept up to date per packet instead of recomputed for every verdict
+        batched = batch_size > 1 and on_result is not None
+        self.connection_history = FlowHistoryStore(window=max(history_window, FEATURE_WINDOW),
+                                                   max_flows=self.flows.max_flows,
+                                                   rolling=not batched)
+        self.flows.add_listener(self.connection_history.forget)
         self.isolation_forest = None
         self.is_trained = False
         self.threat_scores = {}
         
-    def train_ml_model(self):
-        """Train isolation forest on normal traffic patterns"""
+        # Scoring factors come from a compiled, reloadable rule file
+        self.rules = ScoringRules(rules_path)
+        if rules_path and rules_reload_interval:
+            self.rules.watch(rules_reload_interval)
+        
+        # Micro-batched ML scoring: analyses that need a model verdict are
+        # delivered later through on_result instead of analyze_packet's return
+        self.on_result = on_result
+        self.batch_scorer = None
+        if batched:
+            self.batch_scorer = MLBatchScorer(self._on_batch_scored, batch_size, batch_max_latency,
+                                              latency=self.latency)
+            
+        # Flow feature records for offline training (see train_model.py)
+        self.feature_writer = None
+        if feature_export_dir:
+            self.feature_writer = FlowFeatureWriter(feature_export_dir, feature_rotate_seconds)
+            
+        # Warm start from a saved model; cold training only if there is none
+        self.model_path = model_path
+        self.model_info = None  # Metadata and training stats of the active model
+        artifact = load_model(model_path)
+        if artifact is not None:
+            self.install_model(artifact["model"], artifact)
+            print(f"Loaded ML model from {model_path} in {artifact['load_ms']:.0f} ms "
+                  f"(trained {artifact['created']} on {artifact['stats'].get('samples', '?')} vectors)")
+        
+    def install_model(self, model, info=None):
+        """Swap in a fitted model.
+        
+        Scoring reads the model reference once per predict (or per batch),
+        so in-flight work finishes on the old model and everything after
+        the assignment uses the new one; nothing sees a half-updated model.
+        """
+        self.model_info = {k: v for k, v in (info or {}).items() if k != "model"}
+        if self.batch_scorer:
+            self.batch_scorer.model = model
+        self.isolation_forest = model
+        self.is_trained = True
+        
+    def flow_features(self):
+        """(n, FEATURE_COUNT) array of features for every tracked flow.
+        
+        One gather of every full window from the history arrays and one
+        vectorized reduction; no per-flow or per-packet Python work.
+        """
+        history = self.connection_history
+        slots = history.full_slots(FEATURE_WINDOW)
+        if not len(slots):
+            return np.empty((0, FEATURE_COUNT))
+        return window_features(*history.windows(slots, FEATURE_WINDOW))
+        
+    def train_ml_model(self, save=False):
+        """Train isolation forest on normal traffic patterns.
+        
+        With ``save``, the fitted model is written to model_path (when set)
+        so the next start can skip this step; only the startup path asks
+        for that. Returns True if a model was trained.
+        """
         if not SKLEARN_AVAILABLE:
-            return
+            return False
+            
+        # Create feature vectors from connection history (same features
+        # the scorer sees, so the fitted model matches what it is asked)
+        features = self.flow_features()
+        
+        if len(features) <= 20:
+            return False
             
-        # Create feature vectors from connection history
-        features = []
-        for conn, history in self.connection_history.items():
-            if len(history) > 10:
-                # Extract features: packet rate, bytes per packet, protocol diversity
-                recent = history[-50:]  # Last 50 packets
-                packet_rates = []
-                bytes_per_packet = []
-                
-                for i in range(1, len(recent)):
-                    time_diff = (recent[i]["timestamp"] - recent[i-1]["timestamp"]).total_seconds()
-                    if time_diff > 0:
-                        packet_rates.append(1.0 / time_diff)
-                    bytes_per_packet.append(recent[i].get("size", 0))
-                
-                if packet_rates:
-                    features.append([
-                        np.mean(packet_rates) if packet_rates else 0,
-                        np.std(packet_rates) if len(packet_rates) > 1 else 0,
-                        np.mean(bytes_per_packet) if bytes_per_packet else 0,
-                        len(set(p.get("dst_port", 0) for p in recent)),
-                        recent[-1].get("size", 0)
-                    ])
-        
-        if len(features) > 20:
-            features = np.array(features)
-            self.isolation_forest = IsolationForest(
-                contamination=0.1,
-                random_state=42
-            )
-            self.isolation_forest.fit(features)
-            self.is_trained = True
-            print(f"ML Model trained on {len(features)} connection patterns")
-        
-    def analyze_packet(self, packet_info):
-        """Analyze a single packet for threats"""
-        src_ip = packet_info["src_ip"]
-        dst_ip = packet_info["dst_ip"]
-        conn_key = f"{src_ip}->{dst_ip}"
-        
-        # Store in history
-        self.connection_history[conn_key].append(packet_info)
-        
-        # Keep only last 200 packets per connection
-        if len(self.connection_history[conn_key]) > 200:
-            self.connection_history[conn_key] = self.connection_history[conn_key][-200:]
+        start = time.perf_counter()
+        model = IsolationForest(
+            contamination=0.1,
+            random_state=42
+        )
+        model.fit(features)
+        stats = training_stats(model, features, time.perf_counter() - start)
+        info = {"created": datetime.now().isoformat(timespec="seconds"), "stats": stats,
+                "source": "cold"}
+        if save and self.model_path:
+            try:
+                info = save_model(self.model_path, model, stats, source="cold")
+            except OSError as e:
+                print(f"Could not save model to {self.model_path}: {e}")
+        self.install_model(model, info)
+        print(f"ML Model trained on {len(features)} connection patterns")
+        return True
+        
+    def analyze_packet(self, record):
+        """Analyze a single packet (a packet_parser.PacketRecord) for threats"""
+        flow = record.flow
+        if flow is None or not self.shared_flows:
+            flow = self.flows.observe(record)
+        
+        # Store in history (fixed-size ring per connection)
+        timestamp = record.ts_ns * 1e-9
+        history = self.connection_history
+        slot = history.append(flow, timestamp, record.size, record.dst_port)
+        count = int(history.counts[slot])
+        window = history.recent_slot(slot, FEATURE_WINDOW)  # Views, newest last
+        rolling = history.rolling[slot] if history.rolling is not None else None
+        rate = rolling.burst_rate if rolling is not None else burst_rate(window[0], count)
         
+        # Reputation of either endpoint (blocklist / known-bad feed)
+        reputation = self._check_reputation(record.src, record.dst)
+        
+        # One feature record per flow every FEATURE_WINDOW packets
+        if self.feature_writer and count % FEATURE_WINDOW == 0:
+            self.feature_writer.record(record, window)
+        
+        # ML verdict: queued for batch scoring, or predicted inline
+        anomaly = False
+        if self.is_trained and SKLEARN_AVAILABLE and count >= FEATURE_WINDOW:
+            if self.batch_scorer:
+                self.batch_scorer.submit(window, (record, rate, reputation))
+                return None  # Delivered through on_result once scored
+            traced = self.latency.active
+            if traced:
+                start = perf_counter_ns()
+            anomaly = self.isolation_forest.predict([rolling.features()])[0] == -1
+            if traced:
+                self.latency.record("ml_predict", start)
+        
+        return self._build_analysis(record, rate, anomaly, reputation)
+        
+    def get_flow_stats(self):
+        """Tracked-flow count, eviction counters and history memory"""
+        stats = self.flows.get_stats()  # Evictions happen in the flow index
+        stats.update(self.connection_history.get_stats())
+        return stats
+        
+    def flush(self):
+        """Score any analyses still waiting in the ML batch"""
+        if self.batch_scorer:
+            self.batch_scorer.flush()
+            
+    def close(self):
+        """Flush pending work and write out buffered feature records"""
+        if self.batch_scorer:
+            self.batch_scorer.close()
+        if self.feature_writer:
+            self.feature_writer.close()
+            
+    def _on_batch_scored(self, context, anomaly):
+        record, rate, reputation = context
+        self.on_result(self._build_analysis(record, rate, anomaly, reputation))
+        
+    def _check_reputation(self, src, dst):
+        """Return "blocklist", "known-bad" or None for a packet's endpoints"""
+        if self.blocklist and (src in self.blocklist or dst in self.blocklist):
+            return "blocklist"
+        if self.known_bad and (src in self.known_bad or dst in self.known_bad):
+            return "known-bad"
+        return None
+        
+    def _build_analysis(self, record, rate, anomaly, reputation=None):
+        """Score a packet and package the result.
+        
+        The analysis keeps the PacketRecord itself; the alert's display
+        fields (see PacketRecord.alert_fields) are only built for packets
+        that actually raise an alert.
+        """
         # Calculate threat score
-        threat_score = self._calculate_threat_score(packet_info, conn_key)
+        threat_score = self._calculate_threat_score(record, rate, anomaly, reputation)
         
         # Determine severity
         severity = self._get_severity(threat_score)
         
         # Generate alert reason
-        reasons = self._get_threat_reasons(packet_info, threat_score)
+        reasons = self._get_threat_reasons(record, threat_score, rate, reputation)
         
         return {
             "threat_score": threat_score,
             "severity": severity,
             "reasons": reasons,
-            "timestamp": packet_info["timestamp"],
-            "src_ip": src_ip,
-            "dst_ip": dst_ip,
-            "protocol": packet_info["protocol"],
-            "dst_port": packet_info.get("dst_port")
+            "record": record
         }
         
-    def _calculate_threat_score(self, packet, conn_key):
-        """Calculate threat score (0-1) based on multiple factors"""
-        score = 0.0
-        factors = []
-        
-        # Factor 1: Unusual destination port (common attack ports)
-        attack_ports = {
-            22: "SSH", 23: "Telnet", 3389: "RDP", 445: "SMB",
-            1433: "MSSQL", 3306: "MySQL", 5900: "VNC", 8080: "Proxy"
-        }
-        if packet.get("dst_port") in attack_ports:
-            score += 0.3
-            factors.append(f"Attack port {packet['dst_port']} ({attack_ports[packet['dst_port']]})")
-        
-        # Factor 2: Packet rate anomaly (possible DoS)
-        history = self.connection_history.get(conn_key, [])
-        if len(history) > 10:
-            recent = history[-10:]
-            time_span = (recent[-1]["timestamp"] - recent[0]["timestamp"]).total_seconds()
-            if time_span > 0:
-                rate = len(recent) / time_span
-                if rate > 100:  # >100 packets per second
-                    score += 0.4
-                    factors.append(f"High packet rate ({rate:.1f}/sec)")
-        
-        # Factor 3: ML anomaly detection
-        if self.is_trained and SKLEARN_AVAILABLE:
-            features = self._extract_features(conn_key)
-            if features is not None:
-                anomaly = self.isolation_forest.predict([features])[0]
-                if anomaly == -1:
-                    score += 0.3
-                    factors.append("ML-detected anomaly")
-        
-        # Factor 4: ICMP flooding
-        if packet["protocol"] == "ICMP":
-            score += 0.2
-            factors.append("ICMP traffic (potential ping flood)")
-        
-        # Factor 5: Small packets (scanning behavior)
-        if packet.get("size", 0) < 100:
-            score += 0.1
-            factors.append("Small packet size (scanning)")
-            
-        return min(score, 1.0)
-        
-    def _extract_features(self, conn_key):
-        """Extract features for ML model"""
-        history = self.connection_history.get(conn_key, [])
-        if len(history) < 20:
-            return None
-            
-        recent = history[-20:]
-        packet_rates = []
-        bytes_per_packet = []
-        
-        for i in range(1, len(recent)):
-            time_diff = (recent[i]["timestamp"] - recent[i-1]["timestamp"]).total_seconds()
-            if time_diff > 0 and time_diff < 1:
-                packet_rates.append(1.0 / time_diff)
-            bytes_per_packet.append(recent[i].get("size", 0))
-        
-        return [
-            np.mean(packet_rates) if packet_rates else 0,
-            np.std(packet_rates) if len(packet_rates) > 1 else 0,
-            np.mean(bytes_per_packet) if bytes_per_packet else 0,
-            len(set(p.get("dst_port", 0) for p in recent))
-        ]
+    def _calculate_threat_score(self, record, rate, anomaly=False, reputation=None):
+        """Calculate threat score (0-1) from the compiled scoring rules"""
+        return self.rules.current.score(record.dst_port, record.proto, record.size,
+                                        rate, anomaly, reputation)
         
     def _get_severity(self, score):
         """Convert score to severity level"""
-        if score >= 0.8:
-            return "CRITICAL"
-        elif score >= 0.6:
-            return "HIGH"
-        elif score >= 0.3:
-            return "MEDIUM"
-        elif score >= 0.1:
-            return "LOW"
-        else:
-            return "INFO"
+        return severity_for(score)
             
-    def _get_threat_reasons(self, packet, score):
+    def _get_threat_reasons(self, record, score, rate=None, reputation=None):
         """Get human-readable threat reasons"""
-        reasons = []
+        reputation_reasons, rule_reasons = self.rules.current.reasons(
+            record.dst_port, rate, reputation)
+        reasons = list(reputation_reasons)
         
         if score >= 0.8:
             reasons.append("Immediate action required")
-        if packet.get("dst_port") in [22, 3389, 445]:
-            reasons.append(f"Sensitive port {packet['dst_port']} access")
-        if score >= 0.6 and "rate" in str(reasons):
-            reasons.append("Possible DoS attack")
+        reasons.extend(rule_reasons)
             
         return reasons if reasons else ["Normal traffic"]
@@ -0,0 +1,213 @@
+"""
+Multi-process packet analysis pipeline sharded by flow key
+"""
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from ai_analyzer import AIAnalyzer
+from flow_table import FlowTable
+
+CHUNK_SIZE = 256  # Records per inter-process message
+FLUSH_INTERVAL = 0.005  # Max seconds a record waits in a partial chunk
+
+
+def shard_for(src, dst, workers):
+    """Stable shard index for a src->dst flow (int addresses hash deterministically)"""
+    return hash((src, dst)) % workers
+
+
+def _worker_main(shard, inbox, outbox, analyzer_kwargs, min_score, cooldown_ns, max_sources):
+    """Worker process: owns the analyzer state for its shard of flows"""
+    # collect() runs on this loop and on the batch scorer's deadline thread
+    lock = threading.Lock()
+    alerts = []
+    last_sent = FlowTable(max_sources, idle_timeout=cooldown_ns)
+    suppressed = 0
+
+    def collect(analysis):
+        # Pre-filter with the parent's per-source cooldown so repeat alerts
+        # never cross the process boundary; the parent still has the final
+        # say, since a source can have flows on several shards
+        nonlocal suppressed
+        if analysis["threat_score"] < min_score:
+            return
+        with lock:
+            if cooldown_ns:
+                record = analysis["record"]
+                now = record.ts_ns
+                last = last_sent.get(record.src)
+                if last is not None and now - last < cooldown_ns:
+                    suppressed += 1
+                    return
+                last_sent.put(record.src, now, now)
+            alerts.append(analysis)
+
+    def send_alerts():
+        nonlocal alerts, suppressed
+        with lock:
+            batch, count = alerts, suppressed
+            alerts, suppressed = [], 0
+        if batch or count:
+            outbox.put(("alerts", batch, count))
+
+    analyzer = AIAnalyzer(on_result=collect, **analyzer_kwargs)
+
+    while True:
+        try:
+            message = inbox.get(timeout=FLUSH_INTERVAL)
+        except queue.Empty:
+            message = None
+
+        if message == "stop":
+            break
+        elif message == "train":
+            # Every worker fits on its own flows; only shard 0 persists its model.
+            # Requests can pile up while a fit runs, so skip them once trained
+            if not analyzer.is_trained:
+                analyzer.train_ml_model(save=shard == 0)
+            outbox.put(("trained", shard, analyzer.is_trained))
+        elif isinstance(message, tuple):  # ("model", model, info) from the retrainer
+            analyzer.install_model(message[1], message[2])
+        elif message is not None:
+            for record in message:
+                analysis = analyzer.analyze_packet(record)
+                if analysis is not None:
+                    collect(analysis)
+
+        send_alerts()
+
+    analyzer.close()
+    send_alerts()
+
+
+class ShardedAnalysisPipeline:
+    """Fans packets out to N analyzer processes and merges their alerts.
+
+    Records are routed by a hash of the (src, dst) pair so every flow always
+    lands on the same worker, which owns that slice of connection history.
+    Records travel in chunks to amortize pickling; alerts scoring at least
+    ``min_score`` come back on a single queue and are passed to
+    ``on_result`` from a collector thread in this process. With a
+    ``cooldown`` (seconds), each worker drops repeat alerts from a source
+    it already reported within that window before sending anything back.
+    """
+
+    def __init__(self, workers, on_result, analyzer_kwargs=None, min_score=0.1,
+                 cooldown=0, max_sources=100000):
+        self.workers = workers
+        self.on_result = on_result
+        self.analyzer_kwargs = analyzer_kwargs or {}
+        self.min_score = min_score
+        self.cooldown_ns = int(cooldown * 1_000_000_000)
+        self.max_sources = max_sources
+        self.running = False
+        self.processes = []
+        self.inboxes = []
+        self.outbox = None
+        self._buffers = [[] for _ in range(workers)]
+        self._lock = threading.Lock()
+        self.records_submitted = 0
+        self.alerts_received = 0
+        self.alerts_suppressed = 0  # Dropped by the workers' cooldown
+        self.trained_shards = set()
+
+    def start(self):
+        """Spawn the worker processes and the collector/flush threads"""
+        self.outbox = mp.Queue()
+        for shard in range(self.workers):
+            inbox = mp.Queue()
+            process = mp.Process(
+                target=_worker_main,
+                args=(shard, inbox, self.outbox, self.analyzer_kwargs, self.min_score,
+                      self.cooldown_ns, self.max_sources)
+            )
+            process.daemon = True
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+        self.running = True
+        for target in (self._collect_results, self._flush_loop):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+        print(f"Started {self.workers} analysis workers")
+
+    def stop(self):
+        """Drain buffered records and shut the workers down"""
+        self.running = False
+        self.flush()
+        for inbox in self.inboxes:
+            inbox.put("stop")
+        for process in self.processes:
+            process.join(timeout=2)
+
+    def submit(self, packet):
+        """Route one PacketRecord to the worker that owns its flow"""
+        shard = shard_for(packet.src, packet.dst, self.workers)
+        # Queue.put only hands off to a feeder thread, so sending under the
+        # lock is cheap and keeps each shard's chunks in capture order
+        with self._lock:
+            buffer = self._buffers[shard]
+            buffer.append(packet)
+            self.records_submitted += 1
+            if len(buffer) >= CHUNK_SIZE:
+                self._buffers[shard] = []
+                self.inboxes[shard].put(buffer)
+
+    def flush(self):
+        """Send every partial chunk now"""
+        with self._lock:
+            for shard, buffer in enumerate(self._buffers):
+                if buffer:
+                    self._buffers[shard] = []
+                    self.inboxes[shard].put(buffer)
+
+    @property
+    def is_trained(self):
+        """True once every worker has reported a fitted model"""
+        return len(self.trained_shards) == self.workers
+
+    def train(self):
+        """Ask each worker still without a model to train on its own flows.
+
+        Workers answer asynchronously; poll ``is_trained`` and call again
+        until it turns True.
+        """
+        for shard, inbox in enumerate(self.inboxes):
+            if shard not in self.trained_shards:
+                inbox.put("train")
+
+    def install_model(self, model, info=None):
+        """Hand a newly trained model to every worker"""
+        for inbox in self.inboxes:
+            inbox.put(("model", model, info))
+        self.trained_shards.update(range(self.workers))
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def _collect_results(self):
+        while True:
+            try:
+                message = self.outbox.get(timeout=0.5)
+            except queue.Empty:
+                if not self.running:
+                    break  # Stopped and fully drained
+                continue
+            except (EOFError, OSError):
+                break
+            if message[0] == "trained":
+                if message[2]:
+                    self.trained_shards.add(message[1])
+                continue
+            _, alerts, suppressed = message
+            self.alerts_received += len(alerts)
+            self.alerts_suppressed += suppressed
+            for analysis in alerts:
+                self.on_result(analysis)
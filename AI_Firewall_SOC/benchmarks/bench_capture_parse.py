@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scapy dissection vs raw-bytes header parsing on a replayed pcap
+
+Usage:
+    python3 benchmarks/bench_capture_parse.py [capture.pcap] [--packets N] [--snaplen N]
+
+Without a pcap a synthetic TCP/UDP/ICMP capture is generated first.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scapy.all import Ether, IP, TCP, UDP, ICMP, Raw, RawPcapReader, wrpcap
+
+from network_monitor import NetworkMonitor
+from packet_parser import parse_frame
+
+
+def make_synthetic_pcap(path, count):
+    """Write a mixed TCP/UDP/ICMP capture to path"""
+    rng = random.Random(42)
+    packets = []
+    for i in range(count):
+        ip = IP(src=f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                dst=f"192.168.1.{rng.randint(1, 254)}")
+        kind = rng.random()
+        if kind < 0.7:
+            l4 = TCP(sport=rng.randint(1024, 65535), dport=rng.choice([80, 443, 22, 3389]))
+        elif kind < 0.95:
+            l4 = UDP(sport=rng.randint(1024, 65535), dport=rng.choice([53, 123, 5353]))
+        else:
+            l4 = ICMP()
+        packet = Ether() / ip / l4 / Raw(b"x" * rng.choice([0, 64, 512, 1400]))
+        packet.time = 1700000000 + i * 0.0001
+        packets.append(packet)
+    wrpcap(path, packets)
+
+
+def bench_scapy(path):
+    """Full scapy dissection + NetworkMonitor._extract_packet_info"""
+    monitor = NetworkMonitor()
+    parsed = 0
+    start = time.perf_counter()
+    for data, _ in RawPcapReader(path):
+        if monitor._extract_packet_info(Ether(data)):
+            parsed += 1
+    return parsed, time.perf_counter() - start
+
+
+def bench_fast(path, snaplen):
+    """Raw header parsing of frames truncated to snaplen"""
+    parsed = 0
+    reader = RawPcapReader(path)
+    linktype = reader.linktype
+    start = time.perf_counter()
+    for data, meta in reader:
+        ts_ns = meta.sec * 1_000_000_000 + meta.usec * 1000
+        if parse_frame(data[:snaplen], linktype, ts_ns, meta.wirelen):
+            parsed += 1
+    return parsed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pcap", nargs="?", help="capture to replay (default: synthetic)")
+    parser.add_argument("--packets", type=int, default=50000, help="synthetic packet count")
+    parser.add_argument("--snaplen", type=int, default=128, help="bytes kept per frame")
+    args = parser.parse_args()
+
+    path = args.pcap
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f"soc_bench_{args.packets}.pcap")
+        if not os.path.exists(path):
+            print(f"Generating {args.packets} synthetic packets -> {path}")
+            make_synthetic_pcap(path, args.packets)
+
+    print(f"Replaying {path}")
+    for name, run in (("scapy", lambda: bench_scapy(path)),
+                      ("fast-path", lambda: bench_fast(path, args.snaplen))):
+        parsed, elapsed = run()
+        print(f"{name:<10} {parsed:>9} packets  {elapsed:7.2f}s  {parsed / elapsed:>12,.0f} pkts/sec")
+
+
+if __name__ == "__main__":
+    main()
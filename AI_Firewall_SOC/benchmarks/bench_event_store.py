@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: alert store write throughput and indexed query latency
+
+Usage:
+    python3 benchmarks/bench_event_store.py [--rows N] [--db path] [--keep]
+
+Fills a fresh store with N synthetic alerts spread over 30 days (in
+batches, the same way main.py writes), then times per-IP, time-range and
+severity queries against it.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from event_store import EventStore
+
+SEVERITIES = ["LOW"] * 6 + ["MEDIUM"] * 3 + ["HIGH", "CRITICAL"]
+DAY = 86400
+
+
+def fill(store, rows, start, seed=7):
+    rng = random.Random(seed)
+    span = 30 * DAY
+    for i in range(rows):
+        store.record({
+            "timestamp": start + span * i / rows,
+            "src_ip": f"10.{rng.randint(0, 15)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            "dst_ip": f"192.168.1.{rng.randint(1, 254)}",
+            "protocol": "TCP",
+            "dst_port": rng.choice([22, 80, 443, 3389]),
+            "threat_score": rng.random(),
+            "severity": rng.choice(SEVERITIES),
+            "reasons": ["High packet rate"]
+        })
+        while store.get_stats()["pending"] >= store.max_pending // 2:
+            time.sleep(0.001)  # Let the writer catch up instead of dropping
+    store.flush()
+
+
+def timed(label, fn, repeat=20):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    size = result if isinstance(result, int) else len(result)
+    print(f"  {label:<34} p50 {samples[len(samples) // 2]:7.2f} ms   "
+          f"max {samples[-1]:7.2f} ms   ({size} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--keep", action="store_true", help="Don't delete the database")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_events.db")
+    store = EventStore(path, batch_size=5000)
+    start = time.time() - 30 * DAY
+
+    t0 = time.perf_counter()
+    fill(store, args.rows, start)
+    elapsed = time.perf_counter() - t0
+    stats = store.get_stats()
+    print(f"Wrote {stats['written']} alerts in {elapsed:.1f}s "
+          f"({stats['written'] / elapsed:,.0f}/s, dropped {stats['dropped']})")
+    print(f"Database size: {os.path.getsize(path) / 1e6:.0f} MB")
+
+    probe = store.query(limit=1)[0]["src_ip"]
+    day = start + 20 * DAY
+    print("Queries:")
+    timed(f"per-IP ({probe})", lambda: store.query(src_ip=probe))
+    timed("per-IP, one day", lambda: store.query(day, day + DAY, src_ip=probe))
+    timed("time range (1 min)", lambda: store.query(day, day + 60))
+    timed("time range (1 h, count)", lambda: store.count(day, day + 3600))
+    timed("CRITICAL, latest 100", lambda: store.query(severity="CRITICAL", limit=100))
+    timed("CRITICAL in 1 h", lambda: store.query(day, day + 3600, severity="CRITICAL"))
+
+    store.close()
+    if not args.keep and not args.db:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark: NetworkMonitor -> AIAnalyzer -> alert cooldown
+
+Usage:
+    python3 benchmarks/bench_pipeline.py [--packets N] [--mix NAME ...] [--latency] [--output FILE]
+
+Each traffic mix is generated to a pcap, replayed as fast as possible through
+the same FirewallSOCAnalyst.on_packet path the live dashboard uses, and
+measured in its own process so peak RSS is per mix. Needs no root, network
+or display. Results are written as JSON for tracking regressions.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import numpy as np
+
+from traffic_gen import MIXES, write_mix
+from latency import format_table
+
+
+class AlertSink:
+    """Stands in for the dashboard: counts alerts that pass cooldown"""
+
+    def __init__(self):
+        self.alerts = 0
+        self.by_severity = {}
+
+    def add_alert(self, alert):
+        self.alerts += 1
+        self.by_severity[alert["severity"]] = self.by_severity.get(alert["severity"], 0) + 1
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mix(mix, pcap, warmup_pcap, trace_latency=False):
+    """Replay one mix through a fresh analyst and measure it"""
+    import contextlib
+    import io
+
+    # Keep the model, alert history and feature segments of this run out
+    # of the working directory (main reads config at import, so set it first)
+    import config
+    workdir = tempfile.mkdtemp(prefix="soc_bench_")
+    config.MODEL_PATH = os.path.join(workdir, "flow_model.pkl")
+    config.EVENT_DB = os.path.join(workdir, "soc_events.db")
+    config.FEATURE_EXPORT_DIR = os.path.join(workdir, "flow_features")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from main import FirewallSOCAnalyst
+        from network_monitor import NetworkMonitor
+
+        analyst = FirewallSOCAnalyst()
+    analyst.gui = AlertSink()
+
+    latencies = []
+    record = latencies.append
+    on_packet = analyst.on_packet
+
+    def timed_on_packet(packet):
+        start = time.perf_counter_ns()
+        on_packet(packet)
+        record(time.perf_counter_ns() - start)
+
+    def replay(path, callback):
+        monitor = NetworkMonitor(on_packet_callback=callback,
+                                 queue_size=config.CAPTURE_QUEUE_SIZE,
+                                 fast_path=True, replay_file=path,
+                                 latency=analyst.latency, flows=analyst.flows)
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor.start()
+            monitor.wait()
+            monitor.stop()
+        return monitor
+
+    # Warm up on benign traffic and train the model so the ML factor is live
+    if warmup_pcap:
+        replay(warmup_pcap, on_packet)
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyst.analyzer.train_ml_model()
+        analyst.analyzer.flush()
+        analyst.gui = AlertSink()
+
+    analyst.latency.reset()
+    analyst.latency.set_enabled(trace_latency)
+    start = time.perf_counter()
+    monitor = replay(pcap, timed_on_packet)
+    analyst.analyzer.flush()
+    elapsed = time.perf_counter() - start
+
+    packets = len(latencies)
+    latency_us = np.array(latencies, dtype=np.float64) / 1000.0
+    return {
+        "mix": mix,
+        "packets": packets,
+        "seconds": round(elapsed, 4),
+        "packets_per_sec": round(packets / elapsed, 1) if elapsed else None,
+        "latency_p50_us": round(float(np.percentile(latency_us, 50)), 2) if packets else None,
+        "latency_p99_us": round(float(np.percentile(latency_us, 99)), 2) if packets else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "alerts": analyst.gui.alerts,
+        "alerts_by_severity": analyst.gui.by_severity,
+        "ml_trained": analyst.analyzer.is_trained,
+        "capture": monitor.get_statistics()["capture"],
+        "stage_latency": analyst.latency.get_stats() if trace_latency else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--packets", type=int, default=100000, help="packets per mix")
+    parser.add_argument("--mix", action="append", choices=sorted(MIXES), help="mix to run (repeatable)")
+    parser.add_argument("--no-train", action="store_true", help="skip the benign warm-up and ML training")
+    parser.add_argument("--latency", action="store_true",
+                        help="enable sampled per-stage latency tracing and report it")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    args = parser.parse_args()
+
+    mixes = args.mix or list(MIXES)
+    workdir = tempfile.mkdtemp(prefix="soc_bench_")
+    warmup = None
+    if not args.no_train:
+        warmup = os.path.join(workdir, "warmup.pcap")
+        write_mix(warmup, "benign_web", 20000, seed=7)
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for mix in mixes:
+        pcap = os.path.join(workdir, f"{mix}.pcap")
+        write_mix(pcap, mix, args.packets)
+        # Fresh process per mix so peak RSS isn't inherited from the last one
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_mix, (mix, pcap, warmup, args.latency))
+        results.append(result)
+        print(f"{mix:<12} {result['packets_per_sec']:>12,.0f} pkts/sec  "
+              f"p50 {result['latency_p50_us']:>8.1f}us  p99 {result['latency_p99_us']:>9.1f}us  "
+              f"rss {result['peak_rss_mb']:>7.1f}MB  alerts {result['alerts']}")
+        if result["stage_latency"]:
+            print(format_table(result["stage_latency"]))
+
+    report = {
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packets_per_mix": args.packets,
+        "ml_warmup": not args.no_train,
+        "latency_tracing": args.latency,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
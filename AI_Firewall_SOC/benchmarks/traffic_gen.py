@@ -0,0 +1,160 @@
+"""
+Synthetic traffic mixes written straight to pcap files
+
+Frames are packed with struct rather than built as scapy packets, so
+generating millions of packets takes seconds.
+"""
+
+import random
+import socket
+import struct
+
+PCAP_HEADER = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)  # Ethernet
+RECORD_HEADER = struct.Struct("<IIII")
+
+ETHERNET = b"\x00\x11\x22\x33\x44\x55" + b"\x66\x77\x88\x99\xaa\xbb" + b"\x08\x00"
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+TCP_PSH_ACK = 0x18
+TCP_SYN_ACK = 0x12
+
+
+def _ip(number):
+    return socket.inet_aton(number) if isinstance(number, str) else struct.pack("!I", number)
+
+
+def build_frame(src, dst, protocol, sport=0, dport=0, payload=0, flags=TCP_PSH_ACK):
+    """Ethernet + IPv4 + TCP/UDP/ICMP frame with ``payload`` zero bytes"""
+    if protocol == "TCP":
+        l4 = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, flags, 65535, 0, 0)
+        proto = 6
+    elif protocol == "UDP":
+        l4 = struct.pack("!HHHH", sport, dport, 8 + payload, 0)
+        proto = 17
+    else:
+        l4 = struct.pack("!BBHHH", 8, 0, 0, 0, 0)  # Echo request
+        proto = 1
+    total = 20 + len(l4) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, total, 0, 0, 64, proto, 0, _ip(src), _ip(dst))
+    return ETHERNET + ip + l4 + b"\x00" * payload
+
+
+class PcapWriter:
+    """Minimal streaming pcap writer"""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.file.write(PCAP_HEADER)
+        self.count = 0
+
+    def write(self, frame, timestamp):
+        sec = int(timestamp)
+        usec = int(round((timestamp - sec) * 1e6))
+        if usec >= 1000000:
+            sec, usec = sec + 1, usec - 1000000
+        self.file.write(RECORD_HEADER.pack(sec, usec, len(frame), len(frame)))
+        self.file.write(frame)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def benign_web(rng, count):
+    """~50 clients talking HTTP/HTTPS/DNS to a handful of servers"""
+    clients = [f"192.168.1.{i}" for i in range(10, 60)]
+    servers = [f"93.184.216.{i}" for i in range(1, 5)]
+    for _ in range(count):
+        client, server = rng.choice(clients), rng.choice(servers)
+        if rng.random() < 0.1:
+            yield build_frame(client, "8.8.8.8", "UDP", rng.randint(1024, 65535), 53, 40)
+        elif rng.random() < 0.5:
+            yield build_frame(client, server, "TCP", rng.randint(1024, 65535),
+                              rng.choice([80, 443]), rng.choice([0, 200, 600]))
+        else:
+            yield build_frame(server, client, "TCP", rng.choice([80, 443]),
+                              rng.randint(1024, 65535), rng.choice([1200, 1400, 1446]))
+
+
+def syn_scan(rng, count):
+    """One scanner sweeping every port of a few hosts, plus SYN-ACK replies"""
+    scanner = "203.0.113.66"
+    targets = [f"10.0.0.{i}" for i in range(1, 5)]
+    for i in range(count):
+        target = targets[(i // 65535) % len(targets)]
+        port = i % 65535 + 1
+        if rng.random() < 0.05:
+            yield build_frame(target, scanner, "TCP", port, 40000, flags=TCP_SYN_ACK)
+        else:
+            yield build_frame(scanner, target, "TCP", 40000, port, flags=TCP_SYN)
+
+
+def horizontal_scan(rng, count):
+    """One scanner probing SMB across a /16, hidden in benign web traffic"""
+    scanner = "198.51.100.23"
+    benign = benign_web(rng, count)
+    for i in range(count):
+        if i % 4 == 0:
+            target = 0x0A010000 + rng.randint(1, 0xFFFE)  # 10.1.0.0/16
+            yield build_frame(scanner, target, "TCP", 40000 + i % 1000, 445, flags=TCP_SYN)
+        else:
+            yield next(benign)
+
+
+def syn_flood(rng, count):
+    """One source hammering a web server with SYNs; few handshakes answered"""
+    attacker = "203.0.113.99"
+    server = "10.0.0.80"
+    for _ in range(count):
+        if rng.random() < 0.02:
+            yield build_frame(server, attacker, "TCP", 80, rng.randint(1024, 65535),
+                              flags=TCP_SYN_ACK)
+        else:
+            yield build_frame(attacker, server, "TCP", rng.randint(1024, 65535), 80,
+                              flags=TCP_SYN)
+
+
+def icmp_flood(rng, count):
+    """Many sources pinging a single target"""
+    target = "10.0.0.1"
+    for _ in range(count):
+        source = rng.randint(0x0B000000, 0x0B00FFFF)  # 11.0.0.0/16
+        yield build_frame(source, target, "ICMP", payload=56)
+
+
+def many_flows(rng, count):
+    """High-cardinality traffic: nearly every packet is a new src->dst pair"""
+    for _ in range(count):
+        src = rng.randint(0x01000000, 0xDFFFFFFF)
+        dst = rng.randint(0x01000000, 0xDFFFFFFF)
+        if rng.random() < 0.8:
+            yield build_frame(src, dst, "TCP", rng.randint(1024, 65535),
+                              rng.choice([80, 443, 22, 8080]), rng.choice([0, 500]))
+        else:
+            yield build_frame(src, dst, "UDP", rng.randint(1024, 65535), 53, 60)
+
+
+MIXES = {
+    # name: (generator, packets per second of capture time)
+    "benign_web": (benign_web, 5000),
+    "syn_scan": (syn_scan, 50000),
+    "horizontal_scan": (horizontal_scan, 100000),
+    "syn_flood": (syn_flood, 100000),
+    "icmp_flood": (icmp_flood, 100000),
+    "many_flows": (many_flows, 20000),
+}
+
+
+def write_mix(path, mix, count, seed=42, start_time=1700000000.0, rate=None):
+    """Write ``count`` packets of a named mix to a pcap file (``rate`` in pkts/s)"""
+    generator, default_rate = MIXES[mix]
+    rate = rate or default_rate
+    rng = random.Random(seed)
+    writer = PcapWriter(path)
+    try:
+        for i, frame in enumerate(generator(rng, count)):
+            writer.write(frame, start_time + i / rate)
+    finally:
+        writer.close()
+    return writer.count
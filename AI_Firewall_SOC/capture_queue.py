@@ -0,0 +1,93 @@
+"""
+Bounded hand-off queue between packet capture and analysis
+"""
+
+from collections import deque
+
+DROP_NEWEST = "drop-newest"  # Refuse new packets while full
+DROP_OLDEST = "drop-oldest"  # Evict the oldest queued packet to make room
+SAMPLE = "sample"  # While full, admit 1 in N new packets (evicting the oldest)
+
+OVERFLOW_POLICIES = (DROP_NEWEST, DROP_OLDEST, SAMPLE)
+
+
+class BoundedCaptureQueue:
+    """Single-producer/single-consumer bounded queue with drop accounting.
+
+    Built on ``collections.deque``, whose append/popleft are atomic, so the
+    sniff thread never waits on a lock held by the analysis thread. When the
+    queue is full the overflow policy decides what is shed, and every shed
+    packet is counted.
+
+    Under every policy ``enqueued`` counts each packet offered and
+    ``dropped`` each one shed, whether refused on arrival or evicted to
+    make room, so ``enqueued - dropped`` is exactly what the consumer gets.
+    """
+
+    def __init__(self, capacity=65536, policy=DROP_OLDEST, sample_rate=10):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.sample_rate = max(1, sample_rate)
+        self._items = deque()
+        self._overflow_seen = 0
+        self.enqueued = 0
+        self.dequeued = 0
+        self.dropped = 0
+        self.high_watermark = 0
+
+    def put(self, item):
+        """Offer an item; returns False if the item itself was dropped"""
+        items = self._items
+        depth = len(items)
+        self.enqueued += 1
+        if depth >= self.capacity:
+            if self.policy == DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.policy == SAMPLE:
+                self._overflow_seen += 1
+                if self._overflow_seen % self.sample_rate:
+                    self.dropped += 1
+                    return False
+            try:
+                items.popleft()
+                self.dropped += 1
+            except IndexError:
+                pass  # Consumer drained it meanwhile
+        else:
+            self._overflow_seen = 0
+            if depth >= self.high_watermark:
+                self.high_watermark = depth + 1
+
+        items.append(item)
+        return True
+
+    def delivered(self):
+        """Packets that were not shed: already handed out or still queued"""
+        return self.enqueued - self.dropped
+
+    def get(self):
+        """Pop the oldest item, or None if the queue is empty"""
+        try:
+            item = self._items.popleft()
+        except IndexError:
+            return None
+        self.dequeued += 1
+        return item
+
+    def get_stats(self):
+        """Counters for dashboards and reports"""
+        return {
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "drop_rate": self.dropped / self.enqueued if self.enqueued else 0.0,
+            "depth": len(self._items),
+            "high_watermark": self.high_watermark,
+            "capacity": self.capacity,
+            "policy": self.policy
+        }
+
+    def __len__(self):
+        return len(self._items)
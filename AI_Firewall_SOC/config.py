@@ -2,27 +2,95 @@
 Configuration for Firewall AI SOC Analyst
 """
 
+import os
+
 # Mode Configuration
 MODE = "monitor"  # "monitor" (safe) or "active" (blocks IPs)
-# WARNING: Active mode WILL block IPs using pfctl
+# WARNING: Active mode WILL block IPs using pfctl / nft / ipset
+FIREWALL_BACKEND = "auto"  # "auto", "pf", "nftables", "ipset" or "mock"
 
 # Network Configuration
 INTERFACE = "en0"  # Mac WiFi interface (en0 = WiFi, en1 = Ethernet)
+REPLAY_FILE = None  # Path to a pcap/pcapng to replay instead of live capture
+REPLAY_SPEED = 0  # 0 = as fast as possible, 1 = real time, N = N x real time
 CAPTURE_COUNT = 0  # 0 = infinite
 TIMEOUT = 60  # Seconds per capture session
+CAPTURE_FILTER = "ip"  # BPF expression applied in the kernel ("" = capture everything)
+CAPTURE_SNAPLEN = 128  # Bytes copied per packet on the fast path (headers only)
+FAST_CAPTURE = True  # Parse headers from raw bytes instead of building scapy packets
+CAPTURE_QUEUE_SIZE = 65536  # Packets buffered between capture and analysis
+CAPTURE_OVERFLOW_POLICY = "drop-oldest"  # "drop-newest", "drop-oldest" or "sample"
+CAPTURE_SAMPLE_RATE = 10  # With "sample": keep 1 in N packets while the queue is full
 
 # AI Configuration
 USE_LLM = False  # Set to True if Ollama installed
 LLM_MODEL = "tinyllama"
 ANOMALY_THRESHOLD = 0.7  # 0-1, lower = more sensitive
+HISTORY_WINDOW = 20  # Packets kept per connection (ring buffer; features read the last 20)
+MAX_TRACKED_FLOWS = 10000  # Connections an analyzer with its own flow index tracks (analysis workers)
+FLOW_IDLE_TIMEOUT = 300  # Seconds without packets before a flow is forgotten
+MAX_MONITOR_FLOWS = 100000  # Connections in the shared flow index / monitor stats (LRU evicted)
+# Analyzer history holds a row per indexed flow: ~32 bytes x HISTORY_WINDOW each
+TOP_TALKERS_CAPACITY = 1000  # Items tracked by the top-talker sketches (Space-Saving)
+CARDINALITY_WINDOW = 60  # Seconds per distinct-host (HyperLogLog) window
+ML_BATCH_SIZE = 256  # IsolationForest vectors scored per predict() (0 = per packet)
+ML_BATCH_MAX_LATENCY = 0.005  # Max seconds a packet waits for its batch
+ANALYSIS_WORKERS = 0  # Analyzer processes, sharded by flow (0 = inline on capture thread)
+
+# Scoring Rules
+# Ports, rates, protocols, sizes and their weights (shipped next to this file,
+# so it is found whatever directory the daemon starts in)
+SCORING_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_rules.json")
+RULES_RELOAD_INTERVAL = 5  # Seconds between checks for an edited rule file (0 = never)
+
+# Offline Training
+MODEL_PATH = "models/flow_model.pkl"  # Loaded at startup if present (train_model.py writes it)
+FEATURE_EXPORT_DIR = "flow_features"  # Rotating flow feature files (None = disabled)
+FEATURE_ROTATE_SECONDS = 3600  # Start a new feature file every hour
+RETRAIN_INTERVAL = 3600  # Refit the model in the background this often (0 = never)
+RETRAIN_WINDOW = 86400  # Seconds of exported features used for each refit
+RETRAIN_HOLDOUT = 0.2  # Fraction of vectors held out to validate a refit
+RETRAIN_MAX_ANOMALY_RATE = 0.2  # Reject refits flagging more of the holdout than this
+RETRAIN_MAX_DRIFT = 2.0  # Reject refits if the running model flags N x its training rate of recent traffic
+RETRAIN_DRIFT_ADOPT_AFTER = 3  # ...unless that same shift has persisted this many refits (0 = never adopt)
+
+# Scan / Flood Detection (per source, sliding window)
+SCAN_DETECTION = True
+SCAN_WINDOW = 10  # Seconds of traffic each source is judged on
+SCAN_TARGETS = 100  # Distinct (host, port) targets that count as a port scan
+SCAN_HOSTS = 20  # Distinct hosts above which a scan is reported as horizontal
+SYN_FLOOD_THRESHOLD = 200  # Bare SYNs per window before the SYN-ACK ratio is checked
+SYN_FLOOD_RATIO = 3.0  # SYNs per SYN-ACK received that counts as a flood
+MAX_SCAN_SOURCES = 10000  # Sources tracked by the detectors (LRU evicted)
 
 # Blocking Rules
 AUTO_BLOCK_CRITICAL = True
 BLOCK_DURATION = 300  # Seconds to block (300 = 5 minutes)
-WHITELIST_IPS = ["127.0.0.1", "192.168.1.1", "8.8.8.8"]  # Never block these
+RULE_BATCH_WINDOW = 0.05  # Seconds block/unblock requests are coalesced before applying
+WHITELIST_IPS = ["127.0.0.1", "192.168.1.1", "8.8.8.8"]  # Never block these (CIDRs allowed)
+WHITELIST_FILE = None  # Extra whitelist prefixes, one per line
+BLOCKLIST_FILE = None  # Prefixes that are always critical (one per line)
+KNOWN_BAD_FEED = None  # Threat-intel prefixes that raise the threat score
 
 # Alert Settings
 ALERT_COOLDOWN = 60  # Don't alert same IP more than once per minute
+MAX_COOLDOWN_ENTRIES = 100000  # Source IPs remembered for cooldown (LRU evicted)
+
+# Alert History
+EVENT_DB = "soc_events.db"  # SQLite alert store (None = keep alerts in memory only)
+EVENT_BATCH_SIZE = 1000  # Alerts per write transaction
+EVENT_FLUSH_INTERVAL = 0.5  # Max seconds an alert waits before being written
+REPORT_HOURS = 24  # Alert history covered by EXPORT REPORT
+
+# Latency Instrumentation
+LATENCY_TRACKING = False  # Per-stage timing histograms (toggle at runtime from GUI / API)
+LATENCY_SAMPLE_EVERY = 64  # Trace one packet in this many while tracking
+
+# Local API (daemon mode / remote dashboard)
+API_HOST = "127.0.0.1"  # Keep on localhost: the API can block and unblock IPs
+API_PORT = 8787  # HTTP API and /metrics port (0 = disabled)
+RECENT_ALERTS = 1000  # Alerts kept in memory for API clients polling /alerts
 
 # Display
 REFRESH_RATE = 1  # GUI refresh in seconds
+GUI_FRAME_INTERVAL = 0.1  # Seconds between batched alert inserts in the dashboard
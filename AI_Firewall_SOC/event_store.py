@@ -0,0 +1,214 @@
+"""
+Persistent, append-only alert store (SQLite in WAL mode)
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    src_ip TEXT NOT NULL,
+    dst_ip TEXT,
+    protocol TEXT,
+    dst_port INTEGER,
+    threat_score REAL,
+    severity TEXT,
+    reasons TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts (ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_src_ts ON alerts (src_ip, ts);
+CREATE INDEX IF NOT EXISTS idx_alerts_severity_ts ON alerts (severity, ts);
+"""
+
+COLUMNS = ("ts", "src_ip", "dst_ip", "protocol", "dst_port", "threat_score", "severity", "reasons")
+
+_INSERT = f"INSERT INTO alerts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def _connect(path, shared=False):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=not shared)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; safe with WAL
+    return conn
+
+
+def to_row(analysis):
+    """Flatten an analysis dict into an alerts row"""
+    timestamp = analysis["timestamp"]
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.timestamp()
+    return (timestamp, analysis["src_ip"], analysis.get("dst_ip"), analysis.get("protocol"),
+            analysis.get("dst_port"), analysis.get("threat_score"), analysis.get("severity"),
+            "; ".join(analysis.get("reasons", ())))
+
+
+def from_row(row):
+    """Inverse of to_row(): rebuild an analysis-style dict"""
+    ts, src_ip, dst_ip, protocol, dst_port, score, severity, reasons = row
+    return {
+        "timestamp": datetime.fromtimestamp(ts),
+        "src_ip": src_ip,
+        "dst_ip": dst_ip,
+        "protocol": protocol,
+        "dst_port": dst_port,
+        "threat_score": score,
+        "severity": severity,
+        "reasons": reasons.split("; ") if reasons else []
+    }
+
+
+class EventStore:
+    """Alert history that survives restarts.
+
+    record() only appends to an in-memory buffer; a writer thread commits
+    the buffer every ``flush_interval`` seconds (or as soon as
+    ``batch_size`` rows are waiting) with one executemany() per
+    transaction. WAL mode lets queries run while the writer commits.
+    Every query is served from an index on time, (src_ip, time) or
+    (severity, time), so it stays fast as the table grows.
+    """
+
+    def __init__(self, path="soc_events.db", batch_size=1000, flush_interval=0.5,
+                 max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0  # Rows discarded because the writer fell behind
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._local = threading.local()
+
+        self._writer = _connect(path, shared=True)  # Used under _write_lock only
+        self._writer.executescript(SCHEMA)
+        self._writer.commit()
+
+        self.running = True
+        self._thread = threading.Thread(target=self._write_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def record(self, analysis):
+        """Queue one alert for the next batch"""
+        row = to_row(analysis)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """Commit everything buffered so far"""
+        with self._write_lock:
+            with self._lock:
+                rows = self._pending
+                self._pending = []
+            if not rows:
+                return
+            try:
+                with self._writer:  # One transaction per batch
+                    self._writer.executemany(_INSERT, rows)
+                self.written += len(rows)
+            except sqlite3.Error as e:
+                self.dropped += len(rows)
+                print(f"Event store write failed ({len(rows)} alerts): {e}")
+
+    def close(self):
+        self.running = False
+        self._wakeup.set()
+        self._thread.join(timeout=2)
+        self.flush()
+        self._writer.close()
+
+    def _write_loop(self):
+        while self.running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _reader(self):
+        """Per-thread read connection (sqlite3 connections aren't shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _where(start, end, src_ip, severity):
+        clauses, params = [], []
+        if src_ip is not None:
+            clauses.append("src_ip = ?")
+            params.append(src_ip)
+        if severity is not None:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(start.timestamp() if isinstance(start, datetime) else start)
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(end.timestamp() if isinstance(end, datetime) else end)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
+
+    def query(self, start=None, end=None, src_ip=None, severity=None, limit=1000):
+        """Alerts matching all given filters, newest first"""
+        where, params = self._where(start, end, src_ip, severity)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM alerts{where} ORDER BY ts DESC LIMIT ?"
+        rows = self._reader().execute(sql, params + [limit]).fetchall()
+        return [from_row(row) for row in rows]
+
+    def count(self, start=None, end=None, src_ip=None, severity=None):
+        """Number of alerts matching the filters"""
+        where, params = self._where(start, end, src_ip, severity)
+        return self._reader().execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+
+    def severity_counts(self, start=None, end=None):
+        """{severity: count} over a time range"""
+        where, params = self._where(start, end, None, None)
+        sql = f"SELECT severity, COUNT(*) FROM alerts{where} GROUP BY severity"
+        return dict(self._reader().execute(sql, params).fetchall())
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"written": self.written, "pending": pending, "dropped": self.dropped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the SOC alert history")
+    parser.add_argument("--db", default="soc_events.db")
+    parser.add_argument("--ip", help="Source IP")
+    parser.add_argument("--severity")
+    parser.add_argument("--since", help="Start time, YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--until", help="End time, YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+    store = EventStore(args.db)
+    start = time.perf_counter()
+    alerts = store.query(since, until, args.ip, args.severity, args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for alert in alerts:
+        print(f"{alert['timestamp']:%Y-%m-%d %H:%M:%S} | {alert['src_ip']} -> {alert['dst_ip']}:"
+              f"{alert['dst_port']} | {alert['severity']:<8} {alert['threat_score']:.2f} | "
+              f"{', '.join(alert['reasons'])}")
+    print(f"{len(alerts)} alerts in {elapsed:.1f} ms")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Rotating columnar export of per-flow feature records for offline training
+"""
+
+import glob
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from flow_stats import FEATURE_NAMES, FEATURE_WINDOW, window_features
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+KEY_COLUMNS = ("ts_ns", "src", "dst", "proto", "dst_port")  # PacketRecord fields
+COLUMNS = KEY_COLUMNS + tuple(FEATURE_NAMES)
+CHUNK_ROWS = 4096  # Packet windows per preallocated buffer chunk
+
+_DTYPES = {"ts_ns": np.int64, "src": np.uint32, "dst": np.uint32, "proto": np.uint8,
+           "dst_port": np.int32}
+
+
+def _column_array(name, values):
+    return np.array(values, dtype=_DTYPES.get(name, np.float64))
+
+
+class FlowFeatureWriter:
+    """Appends flow feature records to rotating Parquet (or .npz) files.
+
+    Callers hand over a flow's raw packet window rather than its features:
+    the window is copied into a preallocated chunk, and features for the
+    whole segment are computed on the writer thread with one
+    window_features() call per chunk, keeping feature math off the packet
+    path. A segment is closed after ``rotate_seconds`` or ``rotate_rows``
+    records; the writer thread writes it to a temporary name and renames it
+    into place, so readers only ever see complete files. Parquet is used
+    when pyarrow is installed, compressed numpy archives otherwise.
+    Segments older than ``retention_days`` are deleted on rotation.
+    """
+
+    def __init__(self, directory, rotate_seconds=3600, rotate_rows=100000, retention_days=14):
+        self.directory = directory
+        self.rotate_seconds = rotate_seconds
+        self.rotate_rows = rotate_rows
+        self.retention_days = retention_days
+        self.extension = ".parquet" if PYARROW_AVAILABLE else ".npz"
+        self.rows_written = 0
+        self.files_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._columns = {name: [] for name in KEY_COLUMNS}
+        self._chunks = []  # Filled window chunks of the current segment
+        self._new_chunk()
+        self._segment_start = time.time()
+        self._lock = threading.Lock()
+        self._segments = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _new_chunk(self):
+        self._chunk = (np.empty((CHUNK_ROWS, FEATURE_WINDOW), dtype=np.float64),
+                       np.empty((CHUNK_ROWS, FEATURE_WINDOW), dtype=np.uint32),
+                       np.empty((CHUNK_ROWS, FEATURE_WINDOW), dtype=np.int32))
+        self._chunk_rows = 0
+
+    def record(self, packet, window):
+        """Buffer one flow's last FEATURE_WINDOW (timestamps, sizes, ports).
+
+        ``packet`` is the PacketRecord that completed the window; its int
+        fields become the key columns as they are.
+        """
+        dst_port = packet.dst_port
+        with self._lock:
+            columns = self._columns
+            columns["ts_ns"].append(packet.ts_ns)
+            columns["src"].append(packet.src)
+            columns["dst"].append(packet.dst)
+            columns["proto"].append(packet.proto)
+            columns["dst_port"].append(-1 if dst_port is None else dst_port)
+            row = self._chunk_rows
+            for block, values in zip(self._chunk, window):
+                block[row] = values
+            self._chunk_rows = row + 1
+            if self._chunk_rows == CHUNK_ROWS:
+                self._chunks.append(self._chunk)
+                self._new_chunk()
+            if (len(columns["ts_ns"]) >= self.rotate_rows or
+                    time.time() - self._segment_start >= self.rotate_seconds):
+                self._rotate()
+
+    def rotate(self):
+        """Close the current segment now"""
+        with self._lock:
+            self._rotate()
+
+    def close(self):
+        """Write out everything still buffered"""
+        self.rotate()
+        self._segments.put(None)
+        self._thread.join(timeout=10)
+
+    def _rotate(self):
+        """Hand the buffered segment to the writer thread (caller holds the lock)"""
+        if self._columns["ts_ns"]:
+            chunks = self._chunks
+            if self._chunk_rows:
+                chunks.append(tuple(block[:self._chunk_rows] for block in self._chunk))
+            self._segments.put((self._segment_start, self._columns, chunks))
+            self._columns = {name: [] for name in KEY_COLUMNS}
+            self._chunks = []
+            self._new_chunk()
+        self._segment_start = time.time()
+
+    def _write_loop(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                break
+            started, columns, chunks = segment
+            try:
+                features = np.concatenate([window_features(*chunk) for chunk in chunks])
+                for i, name in enumerate(FEATURE_NAMES):
+                    columns[name] = features[:, i]
+                self._write_segment(started, columns)
+                self._expire_old()
+            except Exception as e:
+                print(f"Feature export failed ({len(columns['ts_ns'])} records): {e}")
+
+    def _write_segment(self, started, columns):
+        stamp = datetime.fromtimestamp(started).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory, f"flows_{stamp}_{os.getpid()}{self.extension}")
+        tmp_path = path + ".tmp"
+        arrays = {name: _column_array(name, values) for name, values in columns.items()}
+        if PYARROW_AVAILABLE:
+            table = pa.table(arrays)
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        self.rows_written += len(arrays["ts_ns"])
+        self.files_written += 1
+
+    def _expire_old(self):
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for path in list_segments(self.directory):
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+    def get_stats(self):
+        with self._lock:
+            buffered = len(self._columns["ts_ns"])
+        return {"rows_written": self.rows_written, "files_written": self.files_written,
+                "buffered": buffered}
+
+
+def list_segments(directory, since=None):
+    """Segment files in a directory, oldest first; ``since`` filters by mtime"""
+    paths = glob.glob(os.path.join(directory, "flows_*.parquet"))
+    paths += glob.glob(os.path.join(directory, "flows_*.npz"))
+    if since is not None:
+        paths = [p for p in paths if os.path.getmtime(p) >= since]
+    return sorted(paths, key=os.path.getmtime)
+
+
+def read_segment(path, columns=COLUMNS):
+    """{column: numpy array} for one segment file"""
+    if path.endswith(".parquet"):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required to read Parquet segments")
+        table = pq.read_table(path, columns=list(columns))
+        return {name: table.column(name).to_numpy() for name in columns}
+    with np.load(path) as archive:
+        return {name: archive[name] for name in columns}
+
+
+def load_columns(directory, since=None, columns=COLUMNS):
+    """Concatenate the requested columns across every segment"""
+    parts = {name: [] for name in columns}
+    for path in list_segments(directory, since):
+        try:
+            segment = read_segment(path, columns)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        for name in columns:
+            parts[name].append(segment[name])
+    return {name: np.concatenate(arrays) if arrays else np.array([])
+            for name, arrays in parts.items()}
+
+
+def load_features(directory, since=None):
+    """(n, FEATURE_COUNT) float matrix of every exported feature vector"""
+    columns = load_columns(directory, since, FEATURE_NAMES)
+    if not len(columns[FEATURE_NAMES[0]]):
+        return np.empty((0, len(FEATURE_NAMES)))
+    return np.column_stack([columns[name].astype(np.float64) for name in FEATURE_NAMES])
@@ -0,0 +1,255 @@
+"""
+Firewall backends that apply many rule changes in a single command
+"""
+
+import subprocess
+import sys
+import threading
+import time
+
+RETRY_MIN_DELAY = 0.5  # First retry after a failed backend call (seconds)
+RETRY_MAX_DELAY = 30  # Backoff doubles up to this
+
+
+def _split_families(ips):
+    ipv4 = [ip for ip in ips if ":" not in ip]
+    ipv6 = [ip for ip in ips if ":" in ip]
+    return ipv4, ipv6
+
+
+class PfBackend:
+    """macOS/BSD pf: one pfctl call per batch, addresses fed on stdin"""
+
+    name = "pf"
+
+    def __init__(self, table="blocked_ips", anchor="com.apple/2600"):
+        self.table = table
+        self.anchor = anchor
+
+    def initialize(self):
+        anchor_file = "/tmp/pf_anchor.conf"
+        with open(anchor_file, "w") as f:
+            f.write(f"table <{self.table}> persist\n")
+            f.write(f"block in from <{self.table}> to any\n")
+        subprocess.run(["sudo", "pfctl", "-a", self.anchor, "-f", anchor_file], capture_output=True)
+        subprocess.run(["sudo", "pfctl", "-e"], capture_output=True)
+
+    def _table_op(self, op, ips):
+        result = subprocess.run(
+            ["sudo", "pfctl", "-t", self.table, "-T", op, "-f", "-"],
+            input="\n".join(ips) + "\n", capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+
+    def apply(self, adds, deletes):
+        if adds:
+            self._table_op("add", adds)
+        if deletes:
+            self._table_op("delete", deletes)
+
+
+class NftablesBackend:
+    """Linux nftables: a whole batch is one atomic ``nft -f -`` transaction"""
+
+    name = "nftables"
+
+    def __init__(self, table="soc_firewall", set_name="blocked_ips"):
+        self.table = table
+        self.set_name = set_name
+
+    def initialize(self):
+        t, s = self.table, self.set_name
+        self._run(
+            f"add table inet {t}\n"
+            f"add set inet {t} {s} {{ type ipv4_addr; flags interval; }}\n"
+            f"add set inet {t} {s}6 {{ type ipv6_addr; flags interval; }}\n"
+            f"add chain inet {t} input {{ type filter hook input priority -10; }}\n"
+            f"flush chain inet {t} input\n"
+            f"add rule inet {t} input ip saddr @{s} drop\n"
+            f"add rule inet {t} input ip6 saddr @{s}6 drop\n"
+        )
+
+    def _run(self, script):
+        result = subprocess.run(["sudo", "nft", "-f", "-"], input=script,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+
+    def apply(self, adds, deletes):
+        lines = []
+        for verb, ips in (("add", adds), ("delete", deletes)):
+            for suffix, family in zip(("", "6"), _split_families(ips)):
+                if family:
+                    lines.append(f"{verb} element inet {self.table} {self.set_name}{suffix} "
+                                 f"{{ {', '.join(family)} }}")
+        if lines:
+            self._run("\n".join(lines) + "\n")
+
+
+class IpsetBackend:
+    """Linux ipset + iptables: a whole batch is one ``ipset restore``"""
+
+    name = "ipset"
+
+    def __init__(self, set_name="blocked_ips"):
+        self.set_name = set_name
+
+    def initialize(self):
+        s = self.set_name
+        self._restore(f"create {s} hash:ip -exist\ncreate {s}6 hash:ip family inet6 -exist\n")
+        for tool, suffix in (("iptables", ""), ("ip6tables", "6")):
+            rule = ["INPUT", "-m", "set", "--match-set", s + suffix, "src", "-j", "DROP"]
+            if subprocess.run(["sudo", tool, "-C"] + rule, capture_output=True).returncode != 0:
+                subprocess.run(["sudo", tool, "-I"] + rule, capture_output=True)
+
+    def _restore(self, script):
+        result = subprocess.run(["sudo", "ipset", "restore"], input=script,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+
+    def apply(self, adds, deletes):
+        lines = []
+        for verb, ips in (("add", adds), ("del", deletes)):
+            for suffix, family in zip(("", "6"), _split_families(ips)):
+                lines.extend(f"{verb} {self.set_name}{suffix} {ip} -exist" for ip in family)
+        if lines:
+            self._restore("\n".join(lines) + "\n")
+
+
+class MockBackend:
+    """Records batches instead of touching the host firewall (for tests)"""
+
+    name = "mock"
+
+    def __init__(self):
+        self.batches = []  # (adds, deletes) per apply() call
+        self.table = set()
+
+    def initialize(self):
+        pass
+
+    def apply(self, adds, deletes):
+        self.batches.append((list(adds), list(deletes)))
+        self.table.update(adds)
+        self.table.difference_update(deletes)
+
+
+BACKENDS = {
+    "pf": PfBackend,
+    "nftables": NftablesBackend,
+    "ipset": IpsetBackend,
+    "mock": MockBackend,
+}
+
+
+def create_backend(name="auto"):
+    """Backend by name; "auto" picks pf on macOS/BSD and nftables on Linux"""
+    if name == "auto":
+        name = "nftables" if sys.platform.startswith("linux") else "pf"
+    return BACKENDS[name]()
+
+
+class RuleUpdateQueue:
+    """Coalesces block/unblock requests and applies them in batches.
+
+    Requests are collected for ``window`` seconds and then applied with a
+    single backend call. Only the latest request per IP counts, and requests
+    that don't change the installed state (adding an IP that is already in
+    the table, deleting one that isn't) are dropped before reaching the
+    backend. A batch the backend rejects goes back in the queue and is
+    retried with exponential backoff until it applies.
+    """
+
+    def __init__(self, backend, window=0.05):
+        self.backend = backend
+        self.window = window
+        self.installed = set()
+        self.batches_applied = 0
+        self.failures = 0
+        self.last_error = None
+        self.retry_delay = 0  # Non-zero while the backend is failing
+        self._pending = {}  # ip: True (add) / False (delete)
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()  # One backend call at a time
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.running = True
+        self._thread = threading.Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, ip):
+        self._queue(ip, True)
+
+    def delete(self, ip):
+        self._queue(ip, False)
+
+    def add_many(self, ips):
+        with self._lock:
+            for ip in ips:
+                self._pending[ip] = True
+        self._wakeup.set()
+
+    def _queue(self, ip, add):
+        with self._lock:
+            self._pending[ip] = add
+        self._wakeup.set()
+
+    def pending(self):
+        """Number of IPs waiting for the next batch (including failed ones)"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Apply everything pending now; returns False if the backend failed"""
+        with self._apply_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+            adds = [ip for ip, add in pending.items() if add and ip not in self.installed]
+            deletes = [ip for ip, add in pending.items() if not add and ip in self.installed]
+            if not adds and not deletes:
+                self.retry_delay = 0  # A failed batch may have been cancelled since
+                return True
+            try:
+                self.backend.apply(adds, deletes)
+            except Exception as e:
+                with self._lock:
+                    # Put the batch back, but a request queued since then is newer
+                    for ip in adds:
+                        self._pending.setdefault(ip, True)
+                    for ip in deletes:
+                        self._pending.setdefault(ip, False)
+                self.failures += 1
+                self.last_error = str(e)
+                self.retry_delay = min(max(self.retry_delay * 2, RETRY_MIN_DELAY), RETRY_MAX_DELAY)
+                print(f"Firewall update failed ({len(adds)} adds, {len(deletes)} deletes), "
+                      f"retrying in {self.retry_delay:g}s: {e}")
+                return False
+            self.installed.update(adds)
+            self.installed.difference_update(deletes)
+            self.batches_applied += 1
+            self.retry_delay = 0
+            return True
+
+    def close(self):
+        """Stop the flush thread and apply what is left; False if that failed"""
+        self.running = False
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=1)
+        return self.flush()
+
+    def _flush_loop(self):
+        while self.running:
+            if self.retry_delay:
+                # Backend is failing: retry on the backoff schedule rather
+                # than on every new request
+                self._stopped.wait(self.retry_delay)
+            else:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                time.sleep(self.window)  # Let the burst accumulate
+            self.flush()
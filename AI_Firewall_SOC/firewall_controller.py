@@ -1,85 +1,164 @@
 """
-Firewall controller for Mac (pfctl)
+Firewall controller (pf on Mac, nftables/ipset on Linux)
 """
 
-import subprocess
-import os
+import heapq
+import itertools
+import threading
 import time
 from datetime import datetime
 
+from firewall_backends import create_backend, RuleUpdateQueue
+from ip_trie import PrefixTrie
+
+class BlockExpiryScheduler:
+    """Min-heap of block deadlines drained by a background thread.
+
+    The thread sleeps until the earliest deadline, then hands every entry
+    that is due (up to ``max_batch`` at a time) to ``on_expire`` in one
+    call. Re-blocked IPs are handled lazily: stale heap entries are simply
+    ignored by the callback when their token no longer matches.
+    """
+
+    def __init__(self, on_expire, max_batch=10000):
+        self.on_expire = on_expire
+        self.max_batch = max_batch
+        self._heap = []  # (deadline, ip, token)
+        self._cond = threading.Condition()
+        self.running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        
+    def schedule(self, ip, deadline, token):
+        with self._cond:
+            heapq.heappush(self._heap, (deadline, ip, token))
+            if self._heap[0][0] == deadline:
+                self._cond.notify()  # New earliest deadline
+                
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        self._thread.join(timeout=1)
+        
+    def __len__(self):
+        return len(self._heap)
+        
+    def _run(self):
+        heap = self._heap
+        while True:
+            with self._cond:
+                while self.running:
+                    if not heap:
+                        self._cond.wait()
+                        continue
+                    delay = heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if not self.running:
+                    return
+                now = time.time()
+                due = []
+                while heap and heap[0][0] <= now and len(due) < self.max_batch:
+                    _, ip, token = heapq.heappop(heap)
+                    due.append((ip, token))
+            self.on_expire(due)
+
+
 class FirewallController:
-    def __init__(self, whitelist=None, block_duration=300):
-        self.whitelist = whitelist or ["127.0.0.1", "192.168.1.1"]
+    def __init__(self, whitelist=None, block_duration=300, backend="auto", batch_window=0.05):
+        # CIDR-aware: "10.0.0.0/8" protects the whole range
+        if not isinstance(whitelist, PrefixTrie):
+            whitelist = PrefixTrie(whitelist or ["127.0.0.1", "192.168.1.1"])
+        self.whitelist = whitelist
         self.block_duration = block_duration
-        self.blocked_ips = {}  # ip: timestamp
-        self.is_mac = os.name == 'posix'  # Mac check
+        self.blocked_ips = {}  # ip: (timestamp, reason, token) for active blocks only
+        self.backend = create_backend(backend) if isinstance(backend, str) else backend
+        # Rule changes are coalesced and applied in one backend call per window
+        self.rule_updates = RuleUpdateQueue(self.backend, window=batch_window)
+        
+        # Blocks are removed by the expiry scheduler, so stats are just counters
+        self.lock = threading.Lock()
+        self.total_blocked = 0
+        self.total_expired = 0
+        self.expiry = BlockExpiryScheduler(self._expire_blocks)
+        # Identifies each block so a stale heap entry can't lift a re-block;
+        # unlike a timestamp it never repeats or goes backwards
+        self._block_tokens = itertools.count()
         
     def block_ip(self, ip, reason="Suspicious activity"):
-        """Block IP using Mac's pfctl"""
+        """Queue a block for an IP (applied with the next rule batch)"""
         if ip in self.whitelist:
             print(f"Not blocking whitelisted IP: {ip}")
             return False
             
-        if ip in self.blocked_ips:
-            # Check if block expired
-            if time.time() - self.blocked_ips[ip][0] > self.block_duration:
-                self.unblock_ip(ip)
-            else:
+        with self.lock:
+            if not self._register_block(ip, reason):
                 return False
-                
-        try:
-            # Add block rule to pf
-            cmd = f'sudo pfctl -t blocked_ips -T add {ip}'
-            result = subprocess.run(cmd, shell=True, capture_output=True)
+        self.rule_updates.add(ip)
+        print(f"✓ BLOCKED: {ip} - {reason}")
+        return True
+        
+    def _register_block(self, ip, reason):
+        """Record a new block and schedule its expiry (caller holds the lock)"""
+        if ip in self.blocked_ips:
+            return False  # Still active; the scheduler removes it when due
             
-            if result.returncode == 0:
-                self.blocked_ips[ip] = (time.time(), reason)
-                print(f"✓ BLOCKED: {ip} - {reason}")
-                return True
-            else:
-                print(f"Failed to block {ip}: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            print(f"Error blocking IP {ip}: {e}")
-            return False
+        now = time.time()
+        token = next(self._block_tokens)
+        self.blocked_ips[ip] = (now, reason, token)
+        self.total_blocked += 1
+        self.expiry.schedule(ip, now + self.block_duration, token)
+        return True
             
     def unblock_ip(self, ip):
-        """Unblock an IP"""
-        if ip not in self.blocked_ips:
-            return False
-            
-        try:
-            cmd = f'sudo pfctl -t blocked_ips -T delete {ip}'
-            subprocess.run(cmd, shell=True, capture_output=True)
-            del self.blocked_ips[ip]
-            print(f"✓ UNBLOCKED: {ip}")
-            return True
-        except Exception as e:
-            print(f"Error unblocking {ip}: {e}")
-            return False
-            
-    def initialize_pf(self):
-        """Initialize pf firewall for blocking"""
-        if not self.is_mac:
-            print("Not running on Mac, using simulation mode")
-            return False
+        """Queue removal of an IP's block"""
+        with self.lock:
+            if self.blocked_ips.pop(ip, None) is None:
+                return False
+        self.rule_updates.delete(ip)
+        print(f"✓ UNBLOCKED: {ip}")
+        return True
+        
+    def _expire_blocks(self, due):
+        """Scheduler callback: lift every block whose time is up, as one batch"""
+        expired = []
+        with self.lock:
+            for ip, token in due:
+                entry = self.blocked_ips.get(ip)
+                if entry is not None and entry[2] == token:
+                    del self.blocked_ips[ip]
+                    expired.append(ip)
+            self.total_expired += len(expired)
+        if expired:
+            for ip in expired:
+                self.rule_updates.delete(ip)
+            print(f"✓ EXPIRED: {len(expired)} block(s) lifted")
+        
+    def block_many(self, ips, reason="Suspicious activity"):
+        """Block a list of IPs; they land in the firewall as one batch"""
+        with self.lock:
+            blocked = [ip for ip in ips
+                       if ip not in self.whitelist and self._register_block(ip, reason)]
+        self.rule_updates.add_many(blocked)
+        self.rule_updates.flush()
+        print(f"✓ BLOCKED: {len(blocked)} IPs - {reason}")
+        return blocked
+        
+    def flush(self):
+        """Apply queued rule changes now"""
+        return self.rule_updates.flush()
             
+    def initialize(self):
+        """Prepare the firewall backend for IP blocking"""
         try:
-            # Create anchor file
-            anchor_file = "/tmp/pf_anchor.conf"
-            with open(anchor_file, "w") as f:
-                f.write("table <blocked_ips> persist\n")
-                f.write("block in from <blocked_ips> to any\n")
-            
-            # Load anchor
-            subprocess.run(f'sudo pfctl -a "com.apple/2600" -f {anchor_file}', 
-                          shell=True, capture_output=True)
-            subprocess.run('sudo pfctl -e', shell=True, capture_output=True)
-            print("PF Firewall initialized for IP blocking")
+            self.backend.initialize()
+            print(f"{self.backend.name} firewall initialized for IP blocking")
             return True
         except Exception as e:
-            print(f"Failed to initialize pf: {e}")
+            print(f"Failed to initialize {self.backend.name}: {e}")
             return False
             
     def get_blocked_ips(self):
@@ -87,18 +166,30 @@ class FirewallController:
         return list(self.blocked_ips.keys())
         
     def get_block_stats(self):
-        """Get blocking statistics"""
+        """Get blocking statistics (O(1): maintained incrementally)"""
         return {
-            "total_blocked": len(self.blocked_ips),
-            "active_blocks": len([i for i in self.blocked_ips 
-                                 if time.time() - self.blocked_ips[i][0] < self.block_duration])
+            "total_blocked": self.total_blocked,
+            "active_blocks": len(self.blocked_ips),
+            "expired_blocks": self.total_expired,
+            "rule_batches": self.rule_updates.batches_applied,
+            "rule_failures": self.rule_updates.failures,
+            "rule_pending": self.rule_updates.pending(),
+            "rule_last_error": self.rule_updates.last_error
         }
+        
+    def close(self):
+        """Stop expiring blocks and apply any queued rule changes"""
+        self.expiry.stop()
+        if not self.rule_updates.close():
+            print(f"{self.rule_updates.pending()} firewall rule change(s) not applied")
 
 
 class FirewallSimulator:
     """Simulated firewall for testing (no real blocking)"""
     def __init__(self, whitelist=None):
-        self.whitelist = whitelist or []
+        if not isinstance(whitelist, PrefixTrie):
+            whitelist = PrefixTrie(whitelist or [])
+        self.whitelist = whitelist
         self.blocked_ips = {}
         
     def block_ip(self, ip, reason=""):
@@ -120,3 +211,6 @@ class FirewallSimulator:
         
     def get_block_stats(self):
         return {"total_blocked": len(self.blocked_ips), "active_blocks": len(self.blocked_ips)}
+        
+    def close(self):
+        pass
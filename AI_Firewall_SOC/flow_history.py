@@ -0,0 +1,137 @@
+"""
+Fixed-capacity, numpy-backed packet history per connection
+"""
+
+import numpy as np
+
+from flow_stats import FEATURE_WINDOW, RollingFlowStats
+
+NO_PORT = -1  # Stored in place of a missing (None) port
+
+
+class FlowHistoryStore:
+    """Circular per-flow store of timestamps, sizes and destination ports.
+
+    Rows are indexed directly by flow_table.FlowIndex id, so recording a
+    packet is a handful of array writes with no lookup of its own. Each
+    packet is written twice, at ``pos`` and ``pos + window``, so the last
+    ``n`` packets of a flow are always a contiguous slice and can be
+    returned as numpy views without copying. The arrays grow as higher ids
+    appear, up to the index's ``max_flows``; the index expires and evicts
+    flows, and its listener (forget) empties a row before the id is
+    reused, so memory is bounded by ``max_flows * window``.
+
+    With ``rolling``, each row also keeps a flow_stats.RollingFlowStats fed
+    from the ring before every write, so a flow's features are ready
+    without recomputing them over its window.
+    """
+
+    def __init__(self, window=200, max_flows=10000, initial_flows=256, rolling=False):
+        if rolling and window < FEATURE_WINDOW:
+            raise ValueError(f"Rolling stats need a window of at least {FEATURE_WINDOW} packets")
+        self.window = window
+        self.max_flows = max_flows
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.rolling = [] if rolling else None  # row: RollingFlowStats
+        self._allocate(min(initial_flows, max_flows))
+
+    def _allocate(self, rows):
+        """Grow the backing arrays to ``rows`` flows"""
+        width = 2 * self.window
+        old = len(self.counts)
+        timestamps = np.zeros((rows, width), dtype=np.float64)
+        sizes = np.zeros((rows, width), dtype=np.uint32)
+        ports = np.full((rows, width), NO_PORT, dtype=np.int32)
+        counts = np.zeros(rows, dtype=np.int64)
+        if old:
+            timestamps[:old] = self.timestamps
+            sizes[:old] = self.sizes
+            ports[:old] = self.ports
+            counts[:old] = self.counts
+        self.timestamps = timestamps
+        self.sizes = sizes
+        self.ports = ports
+        self.counts = counts  # Packets written per row since the flow appeared
+        if self.rolling is not None:
+            self.rolling.extend(RollingFlowStats() for _ in range(rows - old))
+
+    def append(self, flow, timestamp, size, dst_port):
+        """Record one packet for a flow; returns its row (the flow id)"""
+        if flow >= len(self.counts):
+            self._allocate(max(flow + 1, min(2 * len(self.counts), self.max_flows)))
+        count = self.counts[flow]
+        pos = count % self.window
+        port = NO_PORT if dst_port is None else dst_port
+        if self.rolling is not None:
+            # Before the write, while the packet leaving the window is still held
+            self.rolling[flow].push(timestamp, size, port, *self.recent_slot(flow, FEATURE_WINDOW))
+
+        self.timestamps[flow, pos] = timestamp
+        self.timestamps[flow, pos + self.window] = timestamp
+        self.sizes[flow, pos] = size
+        self.sizes[flow, pos + self.window] = size
+        self.ports[flow, pos] = port
+        self.ports[flow, pos + self.window] = port
+        self.counts[flow] = count + 1
+        return flow
+
+    def forget(self, flow):
+        """Empty a flow's row (FlowIndex listener: its id is about to be reused)"""
+        if flow < len(self.counts):
+            self.counts[flow] = 0
+            if self.rolling is not None:
+                self.rolling[flow].reset()
+
+    def length(self, flow):
+        """Number of packets currently held for a flow"""
+        if flow >= len(self.counts):
+            return 0
+        return int(min(self.counts[flow], self.window))
+
+    def recent(self, flow, n):
+        """Return (timestamps, sizes, ports) views of the last n packets"""
+        if flow >= len(self.counts) or not self.counts[flow]:
+            empty = slice(0, 0)
+            return self.timestamps[0, empty], self.sizes[0, empty], self.ports[0, empty]
+        return self.recent_slot(flow, n)
+
+    def recent_slot(self, slot, n):
+        """Same as recent() but addressed by row"""
+        count = int(self.counts[slot])
+        end = (count - 1) % self.window + self.window + 1
+        start = end - min(n, count, self.window)
+        return (self.timestamps[slot, start:end],
+                self.sizes[slot, start:end],
+                self.ports[slot, start:end])
+
+    def windows(self, slots, n):
+        """(timestamps, sizes, ports) blocks of shape (len(slots), n).
+
+        One fancy-indexing gather for many rows at once; every row must
+        hold at least n packets.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        end = (self.counts[slots] - 1) % self.window + self.window + 1
+        columns = end[:, None] - n + np.arange(n)
+        rows = slots[:, None]
+        return self.timestamps[rows, columns], self.sizes[rows, columns], self.ports[rows, columns]
+
+    def full_slots(self, n):
+        """Rows of tracked flows holding at least n packets"""
+        return np.flatnonzero(self.counts >= n)
+
+    def get_stats(self):
+        """Flows holding packets and the row budget"""
+        return {"flows": len(self), "max_flows": self.max_flows,
+                "memory_bytes": self.memory_bytes()}
+
+    def memory_bytes(self):
+        """Bytes held by the backing arrays"""
+        return (self.timestamps.nbytes + self.sizes.nbytes +
+                self.ports.nbytes + self.counts.nbytes)
+
+    def __contains__(self, flow):
+        return flow < len(self.counts) and self.counts[flow] > 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.counts))
@@ -0,0 +1,145 @@
+"""
+Flow feature definitions: vectorized reductions for batches, plus a
+streaming per-flow accumulator for inline scoring
+"""
+
+import math
+
+import numpy as np
+
+FEATURE_WINDOW = 20  # Packets behind each ML feature vector
+RATE_WINDOW = 10  # Packets behind the packet-rate (DoS) factor
+FEATURE_NAMES = ["rate_mean", "rate_std", "bytes_mean", "distinct_ports"]
+FEATURE_COUNT = len(FEATURE_NAMES)  # Length of each feature vector
+FEATURE_SCHEMA_VERSION = 1  # Bump whenever a feature's definition changes
+
+
+def window_features(timestamps, sizes, ports):
+    """Feature matrix for a block of packet windows.
+
+    Each argument is an (n, FEATURE_WINDOW) array holding the last
+    FEATURE_WINDOW packets of n flows, oldest first. Every feature is a
+    row-wise reduction, so a whole batch (or every flow at training time)
+    is one pass with no Python loop:
+
+    - rate_mean / rate_std: mean and population std of 1/gap over
+      inter-arrival gaps strictly between 0 and 1 second (0 if none)
+    - bytes_mean: total size of all but the oldest packet / (FEATURE_WINDOW - 1)
+    - distinct_ports: number of distinct destination ports
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    gaps = np.diff(timestamps, axis=1)
+    valid = (gaps > 0) & (gaps < 1)
+    rates = np.divide(1.0, gaps, out=np.zeros_like(gaps), where=valid)
+    n = valid.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    rate_mean = rates.sum(axis=1) / safe_n
+    deviation = np.where(valid, rates - rate_mean[:, None], 0.0)
+    rate_std = np.where(n > 1, np.sqrt((deviation * deviation).sum(axis=1) / safe_n), 0.0)
+
+    sizes = np.asarray(sizes)
+    bytes_mean = sizes[:, 1:].sum(axis=1, dtype=np.float64) / (FEATURE_WINDOW - 1)
+
+    ports = np.sort(ports, axis=1)
+    distinct_ports = 1 + np.count_nonzero(np.diff(ports, axis=1), axis=1)
+
+    return np.column_stack([rate_mean, rate_std, bytes_mean, distinct_ports.astype(np.float64)])
+
+
+def burst_rate(timestamps, count):
+    """Packets/s over the last RATE_WINDOW packets, or None"""
+    if count <= RATE_WINDOW:
+        return None
+    time_span = timestamps[-1] - timestamps[-RATE_WINDOW]
+    if time_span > 0:
+        return RATE_WINDOW / float(time_span)
+    return None
+
+
+class RollingFlowStats:
+    """The window_features() values of one flow, updated in O(1) per packet.
+
+    Each packet adds its own contribution and removes the one leaving the
+    FEATURE_WINDOW-packet window: inter-arrival rates through a sliding
+    Welford mean/variance, sizes through a running sum and destination
+    ports through a reference-counted dict. The results equal
+    window_features() up to float rounding.
+    """
+
+    __slots__ = ("count", "rate_n", "rate_mean", "rate_m2", "byte_sum",
+                 "port_counts", "burst_rate")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.rate_n = 0
+        self.rate_mean = 0.0
+        self.rate_m2 = 0.0
+        self.byte_sum = 0
+        self.port_counts = {}
+        self.burst_rate = None  # Same value as burst_rate() on the flow's history
+
+    def _add_rate(self, rate):
+        self.rate_n += 1
+        delta = rate - self.rate_mean
+        self.rate_mean += delta / self.rate_n
+        self.rate_m2 += delta * (rate - self.rate_mean)
+
+    def _remove_rate(self, rate):
+        self.rate_n -= 1
+        if self.rate_n == 0:
+            self.rate_mean = 0.0
+            self.rate_m2 = 0.0
+            return
+        delta = rate - self.rate_mean
+        self.rate_mean -= delta / self.rate_n
+        self.rate_m2 = max(self.rate_m2 - delta * (rate - self.rate_mean), 0.0)
+
+    def push(self, timestamp, size, port, timestamps, sizes, ports):
+        """Account for a new packet.
+
+        ``timestamps``, ``sizes`` and ``ports`` hold the flow's packets
+        before this one (at least its last FEATURE_WINDOW, oldest first),
+        so the packet leaving the window is still readable.
+        """
+        count = self.count  # Packets before this one
+        self.count = count + 1
+        if count:
+            gap = timestamp - float(timestamps[-1])
+            if 0 < gap < 1:
+                self._add_rate(1.0 / gap)
+            self.byte_sum += size
+        self.port_counts[port] = self.port_counts.get(port, 0) + 1
+
+        if count >= FEATURE_WINDOW:
+            first = len(timestamps) - FEATURE_WINDOW  # Packet leaving the window
+            gap = float(timestamps[first + 1]) - float(timestamps[first])
+            if 0 < gap < 1:
+                self._remove_rate(1.0 / gap)
+            self.byte_sum -= int(sizes[first + 1])
+            old_port = int(ports[first])
+            remaining = self.port_counts[old_port] - 1
+            if remaining:
+                self.port_counts[old_port] = remaining
+            else:
+                del self.port_counts[old_port]
+
+        self.burst_rate = None
+        if count >= RATE_WINDOW:
+            time_span = timestamp - float(timestamps[-(RATE_WINDOW - 1)])
+            if time_span > 0:
+                self.burst_rate = RATE_WINDOW / time_span
+
+    def features(self):
+        """[rate_mean, rate_std, bytes_mean, distinct_ports], or None before FEATURE_WINDOW packets"""
+        if self.count < FEATURE_WINDOW:
+            return None
+        n = self.rate_n
+        return [
+            self.rate_mean if n else 0.0,
+            math.sqrt(self.rate_m2 / n) if n > 1 else 0.0,
+            self.byte_sum / (FEATURE_WINDOW - 1),
+            float(len(self.port_counts))
+        ]
@@ -0,0 +1,219 @@
+"""
+Bounded flow tables with idle-timeout expiry and LRU eviction, and the
+shared index that gives every flow a dense integer id
+"""
+
+from collections import OrderedDict
+
+SWEEP_BATCH = 8  # Max idle entries expired per update
+
+_MISSING = object()
+
+
+class FlowTable:
+    """Mapping of flow key -> state that can't grow without bound.
+
+    Entries are kept in least-recently-seen order, so the idle ones are
+    always at the front. Every update expires at most SWEEP_BATCH idle
+    entries from the front (a lazy, amortized sweep, never a full scan),
+    and inserting past ``max_flows`` evicts the least recently seen entry.
+    ``on_evict(key, value)`` is called for every entry that leaves the
+    table other than through pop().
+    """
+
+    def __init__(self, max_flows=100000, idle_timeout=300, on_evict=None):
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # key: value, least recently seen first
+        self._last_seen = {}
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def touch(self, key, now, factory=None):
+        """Return the entry for key, creating it with factory() if missing"""
+        entries = self._entries
+        value = entries.get(key, _MISSING)
+        if value is _MISSING:
+            self._make_room(now)
+            value = factory() if factory else None
+            entries[key] = value
+        else:
+            entries.move_to_end(key)
+        self._last_seen[key] = now
+        self._sweep(now)
+        return value
+
+    def put(self, key, value, now):
+        """Insert or replace the entry for key"""
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        else:
+            self._make_room(now)
+        entries[key] = value
+        self._last_seen[key] = now
+        self._sweep(now)
+
+    def get(self, key, default=None):
+        """Look up an entry without refreshing it"""
+        return self._entries.get(key, default)
+
+    def pop(self, key, default=None):
+        self._last_seen.pop(key, None)
+        return self._entries.pop(key, default)
+
+    def expire(self, now, limit=None):
+        """Expire idle entries from the front; returns how many were removed"""
+        removed = 0
+        entries = self._entries
+        last_seen = self._last_seen
+        cutoff = now - self.idle_timeout
+        while entries and (limit is None or removed < limit):
+            key = next(iter(entries))
+            if last_seen[key] > cutoff:
+                break
+            value = entries.popitem(last=False)[1]
+            del last_seen[key]
+            self.evicted_idle += 1
+            removed += 1
+            if self.on_evict:
+                self.on_evict(key, value)
+        return removed
+
+    def _sweep(self, now):
+        if self.idle_timeout:
+            self.expire(now, SWEEP_BATCH)
+
+    def _make_room(self, now):
+        """Free a slot for a new entry, preferring idle entries over LRU"""
+        if len(self._entries) >= self.max_flows:
+            self._sweep(now)
+            if len(self._entries) >= self.max_flows:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        key, value = self._entries.popitem(last=False)
+        del self._last_seen[key]
+        self.evicted_capacity += 1
+        if self.on_evict:
+            self.on_evict(key, value)
+
+    def items(self):
+        return self.snapshot().items()
+
+    def snapshot(self):
+        """Plain-dict copy that is safe to take while another thread updates"""
+        while True:
+            try:
+                return dict(self._entries)
+            except RuntimeError:
+                continue  # Mutated mid-copy; retry
+
+    def get_stats(self):
+        """Size and eviction counters"""
+        return {
+            "flows": len(self._entries),
+            "max_flows": self.max_flows,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity
+        }
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def flow_key(src, dst):
+    """Packed key for a src->dst pair of int addresses.
+
+    Two IPv4 addresses fit one 64-bit int; wider (IPv6) addresses fall
+    back to a (src, dst) tuple.
+    """
+    if (src | dst) >> 32:
+        return (src, dst)
+    return (src << 32) | dst
+
+
+def flow_endpoints(key):
+    """Inverse of flow_key(): (src, dst)"""
+    if key.__class__ is tuple:
+        return key
+    return key >> 32, key & 0xFFFFFFFF
+
+
+class FlowIndex:
+    """Dense integer ids for src->dst flows, shared by monitor and analyzer.
+
+    Each packet's endpoints are packed into one int key (see flow_key)
+    and hashed once; the flow gets a small id that stays the same for as
+    long as the flow is tracked. Per-flow state elsewhere lives in lists or
+    arrays indexed by that id, so nothing else re-hashes the flow. Flows
+    are bounded and expired like a FlowTable (times are capture-time
+    nanoseconds); an evicted flow's id is reused by the next new flow, and
+    every callback registered with add_listener() is called with the id
+    first so owners can drop what they hold for it.
+    """
+
+    def __init__(self, max_flows=100000, idle_timeout=300):
+        self.max_flows = max_flows
+        self.table = FlowTable(max_flows, int(idle_timeout * 1_000_000_000),
+                               on_evict=self._release)  # key: id
+        self.keys = []  # id: key (None while the id is free)
+        self.packets = []  # id: packets seen
+        self.bytes = []
+        self.first_seen = []  # id: capture time, ns
+        self.last_seen = []
+        self._free = []
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call ``callback(flow_id)`` whenever a flow is evicted"""
+        self._listeners.append(callback)
+
+    def observe(self, record):
+        """Account one PacketRecord; sets and returns ``record.flow``"""
+        src, dst = record.src, record.dst
+        key = (src, dst) if (src | dst) >> 32 else (src << 32) | dst  # flow_key()
+        now = record.ts_ns
+        flow = self.table.touch(key, now, self._assign)
+        if self.keys[flow] is None:
+            self.keys[flow] = key
+            self.first_seen[flow] = now
+        self.packets[flow] += 1
+        self.bytes[flow] += record.size
+        self.last_seen[flow] = now
+        record.flow = flow
+        return flow
+
+    def _assign(self):
+        """FlowTable factory: a free id, or a new one past the end"""
+        if self._free:
+            return self._free.pop()
+        self.keys.append(None)
+        self.packets.append(0)
+        self.bytes.append(0)
+        self.first_seen.append(0)
+        self.last_seen.append(0)
+        return len(self.keys) - 1
+
+    def _release(self, key, flow):
+        """FlowTable eviction hook: notify owners, then free the id"""
+        for callback in self._listeners:
+            callback(flow)
+        self.keys[flow] = None
+        self.packets[flow] = self.bytes[flow] = 0
+        self._free.append(flow)
+
+    def get(self, src, dst):
+        """Id of a tracked flow, or None"""
+        return self.table.get(flow_key(src, dst))
+
+    def get_stats(self):
+        """Size and eviction counters (same shape as FlowTable.get_stats)"""
+        return self.table.get_stats()
+
+    def __len__(self):
+        return len(self.table)
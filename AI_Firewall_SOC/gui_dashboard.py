@@ -1,15 +1,36 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-from threading import Thread
-from datetime import datetime
+from threading import Thread, Lock
+from collections import deque
+from datetime import datetime, timedelta
 import time
 import os
 
+MAX_THREAT_ROWS = 100  # Rows kept in the live threat table
+MAX_ALERT_BACKLOG = 500  # Alerts queued for the Tk thread; older ones are dropped
+
+
 class FirewallSOCGUI:
-    def __init__(self, monitor, analyzer, firewall):
+    """Tk dashboard.
+
+    Tk widgets are only touched on the Tk thread. Capture and scoring
+    threads hand alerts over through add_alert(), which just appends to a
+    bounded deque, and a background thread collects statistics into a
+    one-slot deque. A root.after() callback drains both once per frame:
+    queued alerts become one batched Treeview insert, and stats text,
+    labels and the blocked list are only rewritten where they changed.
+    """
+
+    def __init__(self, monitor, analyzer, firewall, event_store=None, report_hours=24,
+                 refresh_rate=1, frame_interval=0.1, latency=None):
         self.monitor = monitor
         self.analyzer = analyzer
         self.firewall = firewall
+        self.event_store = event_store
+        self.report_hours = report_hours
+        self.latency = latency  # latency.StageLatency (or a remote stand-in)
+        self.refresh_rate = refresh_rate
+        self.frame_ms = max(int(frame_interval * 1000), 10)
         self.running = True
         
         self.root = tk.Tk()
@@ -19,12 +40,25 @@ class FirewallSOCGUI:
         
         self.alerts_list = []
         self.alerts_generated = 0
+        self.auto_block = False  # Mirrors the checkbox for non-Tk threads
+        
+        # Cross-thread handoff (deque appends and pops are atomic)
+        self._pending_alerts = deque(maxlen=MAX_ALERT_BACKLOG)
+        self._alerts_received = 0
+        self._alert_lock = Lock()
+        self._pending_stats = deque(maxlen=1)  # Latest snapshot wins
+        
+        # What the widgets currently show, for diffing
+        self._shown_labels = {}
+        self._shown_stats = []
+        self._shown_blocked = []
         
         self.setup_ui()
         
         self.update_thread = Thread(target=self.update_display)
         self.update_thread.daemon = True
         self.update_thread.start()
+        self.root.after(self.frame_ms, self.refresh)
         
     def setup_ui(self):
         title_frame = tk.Frame(self.root, bg='#0d7377')
@@ -97,9 +131,16 @@ class FirewallSOCGUI:
         self.auto_block_var = tk.BooleanVar(value=False)
         auto_block_btn = tk.Checkbutton(control_frame, text="Auto-Block Threats", 
                                         variable=self.auto_block_var, bg='#2d2d2d', fg='white',
-                                        selectcolor='#2d2d2d')
+                                        selectcolor='#2d2d2d', command=self._toggle_auto_block)
         auto_block_btn.pack(side=tk.LEFT, padx=10)
         
+        if self.latency is not None:
+            self.latency_var = tk.BooleanVar(value=self.latency.enabled)
+            latency_btn = tk.Checkbutton(control_frame, text="Latency Tracing",
+                                         variable=self.latency_var, bg='#2d2d2d', fg='white',
+                                         selectcolor='#2d2d2d', command=self._toggle_latency)
+            latency_btn.pack(side=tk.LEFT, padx=10)
+        
         stop_btn = tk.Button(control_frame, text="STOP MONITORING", command=self.stop_monitoring,
                             bg='#ff0000', fg='white', font=('Arial', 10, 'bold'))
         stop_btn.pack(side=tk.RIGHT, padx=10)
@@ -112,67 +153,174 @@ class FirewallSOCGUI:
                                bg='#ff6600', fg='white', font=('Arial', 10, 'bold'))
         unblock_btn.pack(side=tk.RIGHT, padx=10)
         
+    def _toggle_auto_block(self):
+        self.auto_block = self.auto_block_var.get()
+        
+    def _toggle_latency(self):
+        self.latency.set_enabled(self.latency_var.get())
+        
     def update_display(self):
+        """Background thread: collect a stats snapshot every refresh_rate seconds"""
         while self.running:
             try:
-                self.packet_count.config(text=f"Packets: {self.monitor.get_total_packets()}")
-                self.update_statistics()
-                self.update_blocked_list()
-                time.sleep(0.5)
-            except:
-                break
+                self._pending_stats.append({
+                    "packets": self.monitor.get_total_packets(),
+                    "stats": self.update_statistics(),
+                    "blocked": self.firewall.get_blocked_ips()[:30]
+                })
+            except Exception as e:
+                print(f"[GUI] Stats collection failed: {e}")
+            time.sleep(self.refresh_rate)
                 
     def add_alert(self, alert):
-        self.alerts_generated += 1
-        self.alert_count.config(text=f"Alerts: {self.alerts_generated}")
-        self.alerts_list.append(alert)
-        
-        severity = alert['severity'].lower()
-        self.threat_tree.insert('', 0, values=(
-            alert['timestamp'].strftime('%H:%M:%S'),
-            alert['src_ip'],
-            alert['dst_ip'],
-            f"{alert['threat_score']:.2f}",
-            alert['severity']
-        ), tags=(severity,))
-        
-        if self.auto_block_var.get() and alert['severity'] in ['CRITICAL', 'HIGH']:
-            self.firewall.block_ip(alert['src_ip'], f"Auto-block: {alert['severity']}")
+        """Queue an alert for display; safe to call from any thread"""
+        with self._alert_lock:
+            self._alerts_received += 1
+        self._pending_alerts.append(alert)
         
-        if len(self.threat_tree.get_children()) > 100:
-            last = self.threat_tree.get_children()[-1]
-            self.threat_tree.delete(last)
+        # Blocking doesn't wait for the display
+        if self.auto_block and alert['severity'] in ['CRITICAL', 'HIGH']:
+            self.firewall.block_ip(alert['src_ip'], f"Auto-block: {alert['severity']}")
         
-        if len(self.alerts_list) > 500:
-            self.alerts_list = self.alerts_list[-500:]
+    def refresh(self):
+        """Tk thread, once per frame: apply queued alerts and the latest stats"""
+        if not self.running:
+            return
+        try:
+            self._drain_alerts()
+            if self._pending_stats:
+                snapshot = self._pending_stats.pop()
+                self._set_label(self.packet_count, f"Packets: {snapshot['packets']}")
+                self._show_statistics(snapshot['stats'])
+                self.update_blocked_list(snapshot['blocked'])
+        finally:
+            self.root.after(self.frame_ms, self.refresh)
+            
+    def _drain_alerts(self):
+        """Insert every queued alert as one batch, newest on top"""
+        pending = self._pending_alerts
+        batch = []
+        while pending:
+            batch.append(pending.popleft())
+        if not batch:
+            return
+        # Count what was received, including anything the bounded queue dropped
+        self.alerts_generated = self._alerts_received
+        self._set_label(self.alert_count, f"Alerts: {self.alerts_generated}")
+        self.alerts_list.extend(batch)
+        if len(self.alerts_list) > MAX_ALERT_BACKLOG:
+            del self.alerts_list[:-MAX_ALERT_BACKLOG]
+        
+        # Alerts that would be pushed straight out of the table are never inserted
+        for alert in batch[-MAX_THREAT_ROWS:]:
+            self.threat_tree.insert('', 0, values=(
+                alert['timestamp'].strftime('%H:%M:%S'),
+                alert['src_ip'],
+                alert['dst_ip'],
+                f"{alert['threat_score']:.2f}",
+                alert['severity']
+            ), tags=(alert['severity'].lower(),))
+        
+        rows = self.threat_tree.get_children()
+        if len(rows) > MAX_THREAT_ROWS:
+            self.threat_tree.delete(*rows[MAX_THREAT_ROWS:])
+            
+    def _set_label(self, label, text):
+        if self._shown_labels.get(label) != text:
+            label.config(text=text)
+            self._shown_labels[label] = text
+            
+    def _show_statistics(self, text):
+        """Rewrite only the lines of the stats panel that changed"""
+        lines = text.split("\n")
+        shown = self._shown_stats
+        if len(lines) != len(shown):
+            self.stats_text.delete(1.0, tk.END)
+            self.stats_text.insert(1.0, text)
+        else:
+            for number, (line, old) in enumerate(zip(lines, shown), 1):
+                if line != old:
+                    self.stats_text.delete(f"{number}.0", f"{number}.end")
+                    self.stats_text.insert(f"{number}.0", line)
+        self._shown_stats = lines
         
     def update_statistics(self):
+        """Build the stats panel text (runs on the stats thread)"""
         stats = "=" * 30 + " SYSTEM STATS " + "=" * 30 + "\n\n"
         stats += f"Total Packets: {self.monitor.get_total_packets()}\n"
         stats += f"Total Alerts: {self.alerts_generated}\n\n"
         stats += "=" * 30 + " TOP CONNECTIONS " + "=" * 30 + "\n"
         
-        conn_stats = self.monitor.get_statistics()
-        sorted_conns = sorted(conn_stats.items(), key=lambda x: x[1]['count'], reverse=True)[:10]
-        for conn, data in sorted_conns:
-            stats += f"{conn:<30} {data['count']:>6} packets\n"
+        monitor_stats = self.monitor.get_statistics()
+        for conn, count, error in monitor_stats['top_connections']:
+            stats += f"{conn:<30} {self._approx(count, error):>8} packets\n"
+        
+        stats += "\n" + "=" * 30 + " TOP SOURCES " + "=" * 30 + "\n"
+        for src, count, error in monitor_stats['top_sources']:
+            stats += f"{src:<30} {self._approx(count, error):>8} packets\n"
+        
+        distinct = monitor_stats['distinct']
+        stats += "\n" + "=" * 30 + f" DISTINCT HOSTS ({distinct['window']}s) " + "=" * 30 + "\n"
+        stats += f"Sources: ~{distinct['sources']}"
+        if 'previous_sources' in distinct:
+            stats += f" (previous window ~{distinct['previous_sources']})"
+        stats += f"\nDestinations: ~{distinct['destinations']}"
+        if 'previous_destinations' in distinct:
+            stats += f" (previous window ~{distinct['previous_destinations']})"
+        stats += "\n"
+        
+        stats += "\n" + "=" * 30 + " CAPTURE QUEUE " + "=" * 30 + "\n"
+        capture = monitor_stats['capture']
+        stats += f"Offered: {capture['enqueued']}\n"
+        stats += f"Dropped: {capture['dropped']} ({capture['drop_rate']:.2%}, {capture['policy']})\n"
+        stats += f"Depth: {capture['depth']}/{capture['capacity']}\n"
+        stats += f"High Watermark: {capture['high_watermark']}\n"
+        
+        stats += "\n" + "=" * 30 + " FLOW TABLES " + "=" * 30 + "\n"
+        flows = monitor_stats['flows']
+        stats += f"Monitor Flows: {flows['flows']}/{flows['max_flows']}\n"
+        stats += f"  Evicted (idle/cap): {flows['evicted_idle']}/{flows['evicted_capacity']}\n"
+        flows = self.analyzer.get_flow_stats()
+        stats += f"Analyzer Flows: {flows['flows']}/{flows['max_flows']}\n"
+        stats += f"  Evicted (idle/cap): {flows['evicted_idle']}/{flows['evicted_capacity']}\n"
         
         stats += "\n" + "=" * 30 + " BLOCKING STATS " + "=" * 30 + "\n"
         block_stats = self.firewall.get_block_stats()
         stats += f"Total Blocked: {block_stats['total_blocked']}\n"
         stats += f"Active Blocks: {block_stats['active_blocks']}\n"
         
-        self.stats_text.delete(1.0, tk.END)
-        self.stats_text.insert(1.0, stats)
-        
-    def update_blocked_list(self):
-        self.blocked_listbox.delete(0, tk.END)
-        blocked = self.firewall.get_blocked_ips()
-        if blocked:
-            for ip in blocked[:30]:
-                self.blocked_listbox.insert(tk.END, ip)
-        else:
-            self.blocked_listbox.insert(tk.END, "No IPs currently blocked")
+        if self.event_store:
+            store_stats = self.event_store.get_stats()
+            stats += "\n" + "=" * 30 + " ALERT HISTORY " + "=" * 30 + "\n"
+            stats += f"Stored: {store_stats['written']} (pending {store_stats['pending']})\n"
+            stats += f"Dropped: {store_stats['dropped']}\n"
+        
+        if self.latency is not None:
+            stats += "\n" + "=" * 30 + " STAGE LATENCY " + "=" * 30 + "\n"
+            stats += self.latency.format_table()
+        
+        return stats
+        
+    @staticmethod
+    def _approx(count, error):
+        """Sketch count, marked with ~ when it may be overestimated"""
+        return f"~{count}" if error else str(count)
+        
+    def update_blocked_list(self, blocked):
+        """Bring the listbox in line with ``blocked``, touching only changed rows"""
+        rows = blocked or ["No IPs currently blocked"]
+        shown = self._shown_blocked
+        if rows == shown:
+            return
+        for index, (row, old) in enumerate(zip(rows, shown)):
+            if row != old:
+                self.blocked_listbox.delete(index)
+                self.blocked_listbox.insert(index, row)
+        if len(shown) > len(rows):
+            self.blocked_listbox.delete(len(rows), tk.END)
+        for row in rows[len(shown):]:
+            self.blocked_listbox.insert(tk.END, row)
+        self._shown_blocked = list(rows)
             
     def export_report(self):
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -187,16 +335,48 @@ class FirewallSOCGUI:
                 f.write(f"Total Packets: {self.monitor.get_total_packets()}\n")
                 f.write(f"Total Alerts: {self.alerts_generated}\n\n")
                 
+                if self.event_store:
+                    # Full history for the report window, not just this session
+                    self.event_store.flush()
+                    since = datetime.now() - timedelta(hours=self.report_hours)
+                    alerts = self.event_store.query(start=since, limit=10000)[::-1]
+                    counts = self.event_store.severity_counts(start=since)
+                    title = f"ALERT DETAILS (Last {self.report_hours} hours)"
+                else:
+                    alerts = self.alerts_list[-100:]
+                    counts = {}
+                    title = "ALERT DETAILS (Last 100 alerts)"
+                
+                monitor_stats = self.monitor.get_statistics()
+                f.write("TOP TALKERS\n")
+                for src, count, error in monitor_stats['top_sources']:
+                    f.write(f"  {src:<20} {self._approx(count, error)} packets\n")
+                distinct = monitor_stats['distinct']
+                f.write(f"Distinct sources/destinations (last {distinct['window']}s): "
+                        f"~{distinct['sources']}/~{distinct['destinations']}\n\n")
+                
+                if counts:
+                    f.write("ALERTS BY SEVERITY\n")
+                    for severity, count in sorted(counts.items(), key=lambda x: -x[1]):
+                        f.write(f"  {severity:<10} {count}\n")
+                    f.write("\n")
+                
                 f.write("=" * 70 + "\n")
-                f.write("ALERT DETAILS (Last 100 alerts)\n")
+                f.write(title + "\n")
                 f.write("=" * 70 + "\n")
                 
-                for i, alert in enumerate(self.alerts_list[-100:], 1):
-                    f.write(f"\n{i}. {alert['timestamp'].strftime('%H:%M:%S')} | ")
+                for i, alert in enumerate(alerts, 1):
+                    f.write(f"\n{i}. {alert['timestamp'].strftime('%Y-%m-%d %H:%M:%S')} | ")
                     f.write(f"{alert['src_ip']} -> {alert['dst_ip']} | ")
                     f.write(f"Score: {alert['threat_score']:.2f} | ")
                     f.write(f"Severity: {alert['severity']}\n")
                 
+                if self.latency is not None:
+                    f.write("\n" + "=" * 70 + "\n")
+                    f.write("STAGE LATENCY (sampled packets)\n")
+                    f.write("=" * 70 + "\n")
+                    f.write(self.latency.format_table())
+                
                 f.write("\n" + "=" * 70 + "\n")
                 f.write("BLOCKED IPS\n")
                 f.write("=" * 70 + "\n")
@@ -0,0 +1,158 @@
+"""
+Path-compressed binary (Patricia) trie for IPv4/IPv6 CIDR membership
+"""
+
+import ipaddress
+import socket
+
+_AF_INET6 = socket.AF_INET6
+
+
+def ip_to_int(ip):
+    """Return (int, bit width) for an address string, or (None, 0) if invalid.
+
+    An int is taken to be an IPv4 address already in PacketRecord form.
+    """
+    if ip.__class__ is int:
+        return ip, 32
+    try:
+        return int.from_bytes(socket.inet_aton(ip), "big"), 32
+    except OSError:
+        pass
+    try:
+        return int.from_bytes(socket.inet_pton(_AF_INET6, ip), "big"), 128
+    except (OSError, TypeError):
+        return None, 0
+
+
+class _Node:
+    __slots__ = ("key", "length", "value", "children")
+
+    def __init__(self, key, length, value=None):
+        self.key = key  # Prefix bits, left-aligned to the family's width
+        self.length = length
+        self.value = value
+        self.children = [None, None]
+
+
+class PrefixTrie:
+    """Longest-prefix-match lookups over a set of CIDR prefixes.
+
+    Nodes exist only where prefixes end or branch, so a lookup visits at
+    most one node per stored prefix along the address's path and never more
+    than the prefix length in bits. Each prefix carries a value (e.g. the
+    feed it came from); a plain address is stored as a /32 or /128.
+    """
+
+    def __init__(self, prefixes=None):
+        self._roots = {32: _Node(0, 0), 128: _Node(0, 0)}
+        self.count = 0
+        for prefix in prefixes or ():
+            self.add(prefix)
+
+    def add(self, prefix, value=True):
+        """Insert a CIDR string (or bare address)"""
+        network = ipaddress.ip_network(prefix.strip(), strict=False)
+        width = network.max_prefixlen
+        key = int(network.network_address)
+        length = network.prefixlen
+        node = self._roots[width]
+
+        while True:
+            if node.length == length:
+                if node.value is None:
+                    self.count += 1
+                node.value = value
+                return
+            bit = (key >> (width - 1 - node.length)) & 1
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(key, length, value)
+                self.count += 1
+                return
+
+            # Length of the prefix shared with the child
+            common = min(width - (key ^ child.key).bit_length(), length, child.length)
+            if common == child.length:
+                node = child
+                continue
+
+            # Split the edge at the point where the prefixes diverge
+            mask = ((1 << common) - 1) << (width - common)
+            branch = _Node(key & mask, common)
+            branch.children[(child.key >> (width - 1 - common)) & 1] = child
+            node.children[bit] = branch
+            if common == length:
+                branch.value = value
+            else:
+                branch.children[(key >> (width - 1 - common)) & 1] = _Node(key, length, value)
+            self.count += 1
+            return
+
+    def remove(self, prefix):
+        """Drop an exact prefix; returns False if it wasn't present"""
+        network = ipaddress.ip_network(prefix.strip(), strict=False)
+        width = network.max_prefixlen
+        key = int(network.network_address)
+        node = self._roots[width]
+        while node is not None and node.length < network.prefixlen:
+            node = node.children[(key >> (width - 1 - node.length)) & 1]
+        if node is None or node.length != network.prefixlen or node.key != key or node.value is None:
+            return False
+        node.value = None
+        self.count -= 1
+        return True
+
+    def lookup(self, ip):
+        """Value of the longest prefix covering ip, or None"""
+        addr, width = ip_to_int(ip)
+        if addr is None:
+            return None
+        node = self._roots[width]
+        best = node.value
+        while node.length < width:
+            child = node.children[(addr >> (width - 1 - node.length)) & 1]
+            if child is None or (addr ^ child.key) >> (width - child.length):
+                break
+            if child.value is not None:
+                best = child.value
+            node = child
+        return best
+
+    def load_file(self, path, value=True):
+        """Add one prefix per line ('#' comments allowed); returns count added"""
+        added = 0
+        with open(path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    self.add(line, value)
+                    added += 1
+                except ValueError:
+                    print(f"Skipping invalid prefix in {path}: {line}")
+        return added
+
+    def __contains__(self, ip):
+        return self.lookup(ip) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+
+def load_trie(prefixes=(), path=None, value=True):
+    """Build a trie from inline prefixes plus an optional prefix file"""
+    trie = PrefixTrie()
+    for prefix in prefixes:
+        trie.add(prefix, value)
+    if path:
+        try:
+            added = trie.load_file(path, value)
+            print(f"Loaded {added} prefixes from {path}")
+        except OSError as e:
+            print(f"Could not load prefixes from {path}: {e}")
+    return trie
@@ -0,0 +1,141 @@
+"""
+Sampled per-stage latency histograms for the packet path
+"""
+
+import threading
+from time import perf_counter_ns
+
+SUB_BUCKET_BITS = 4  # 16 linear sub-buckets per power of two: ~6% resolution
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_LINEAR_LIMIT = 2 * _SUB_BUCKETS  # Values below this get one bucket each
+BUCKETS = 64 * _SUB_BUCKETS  # Enough for any 64-bit nanosecond value
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def bucket_index(value):
+    """Log-linear (HDR-style) bucket for a non-negative integer"""
+    if value < _LINEAR_LIMIT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+
+def bucket_floor(index):
+    """Smallest value that lands in a bucket"""
+    if index < _LINEAR_LIMIT:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return (index - (shift << SUB_BUCKET_BITS)) << shift
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear histogram of nanosecond durations.
+
+    Recording is one bit_length() and a list increment; memory is BUCKETS
+    counters whatever the range. Percentiles are reported as the midpoint
+    of the bucket they fall in, so they are within ~3% of the exact value.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        if value < _LINEAR_LIMIT:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - SUB_BUCKET_BITS - 1
+            self.counts[(shift << SUB_BUCKET_BITS) + (value >> shift)] += 1  # bucket_index()
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Value below which q percent of the recorded durations fall"""
+        if not self.count:
+            return 0
+        target = max(1, round(self.count * q / 100))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                low, high = bucket_floor(index), bucket_floor(index + 1)
+                return min((low + high) // 2, self.max)
+        return self.max
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """Count plus mean / percentiles / max in microseconds"""
+        stats = {"count": self.count,
+                 "mean_us": self.total / self.count / 1000 if self.count else 0.0,
+                 "max_us": self.max / 1000}
+        for q in PERCENTILES:
+            stats[f"p{q:g}_us"] = self.percentile(q) / 1000
+        return stats
+
+
+class StageLatency:
+    """Per-stage latency histograms for a sample of packets.
+
+    While instrumentation is enabled the capture loop traces every
+    ``sample_every``-th packet: it sets ``active`` for the duration of that
+    packet, and each stage the packet passes through checks ``active`` and
+    records its elapsed time. Untraced packets pay one attribute check per
+    stage, so the overhead stays small even on the hot path. Per-batch work (ML
+    predict) is timed on every batch while enabled. Toggle at runtime with
+    set_enabled(); histograms survive a toggle until reset().
+    """
+
+    def __init__(self, sample_every=64, enabled=False):
+        self.sample_every = max(int(sample_every), 1)
+        self.enabled = enabled
+        self.active = False  # True while the current packet is being traced
+        self.histograms = {}  # stage: LatencyHistogram, in first-seen order
+        self._lock = threading.Lock()
+
+    def record(self, stage, start_ns):
+        """Record the time since start_ns (from perf_counter_ns) for a stage"""
+        elapsed = perf_counter_ns() - start_ns
+        try:
+            self.histograms[stage].record(elapsed)
+        except KeyError:
+            with self._lock:
+                self.histograms.setdefault(stage, LatencyHistogram()).record(elapsed)
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        if not enabled:
+            self.active = False
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def get_stats(self):
+        """{stage: summary} for every stage seen so far"""
+        return {stage: histogram.summary() for stage, histogram in list(self.histograms.items())}
+
+    def format_table(self):
+        return format_table(self.get_stats(), self.enabled)
+
+
+def format_table(stats, enabled=True):
+    """Fixed-width text table of get_stats() output"""
+    if not stats:
+        return "No latency samples" + ("" if enabled else " (tracing off)") + "\n"
+    lines = [f"{'Stage':<17}{'Count':>8}{'Mean':>8}{'p50':>8}{'p99':>8}{'p99.9':>8}{'Max':>9} us"]
+    for stage, s in stats.items():
+        lines.append(f"{stage:<17}{s['count']:>8}{s['mean_us']:>8.1f}{s['p50_us']:>8.1f}"
+                     f"{s['p99_us']:>8.1f}{s['p99.9_us']:>8.1f}{s['max_us']:>9.1f}")
+    return "\n".join(lines) + "\n"
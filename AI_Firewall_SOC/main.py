@@ -3,17 +3,27 @@
 Main entry point for Firewall AI SOC Analyst
 """
 
+import argparse
+import signal
 import sys
 import os
 import threading
-from datetime import datetime
+import time
+from collections import deque, defaultdict
 
 # Import modules
 from config import *
 from network_monitor import NetworkMonitor
 from ai_analyzer import AIAnalyzer
 from firewall_controller import FirewallController, FirewallSimulator
-from gui_dashboard import FirewallSOCGUI
+from analysis_pipeline import ShardedAnalysisPipeline
+from flow_table import FlowTable, FlowIndex
+from event_store import EventStore
+from model_retrainer import ModelRetrainer
+from ip_trie import load_trie
+from scan_detector import ScanDetector
+from soc_api import SOCApiServer
+from latency import StageLatency
 
 class FirewallSOCAnalyst:
     def __init__(self):
@@ -21,59 +31,241 @@ class FirewallSOCAnalyst:
         print("🔒 FIREWALL AI SOC ANALYST 🔒")
         print("=" * 60)
         print(f"Mode: {MODE.upper()}")
-        print(f"Interface: {INTERFACE}")
+        print(f"Interface: {INTERFACE}" if not REPLAY_FILE else f"Replay: {REPLAY_FILE}")
         print(f"LLM Enabled: {USE_LLM}")
         print("=" * 60)
         
+        # CIDR prefix sets for whitelist / blocklist / threat-feed lookups
+        whitelist = load_trie(WHITELIST_IPS, WHITELIST_FILE)
+        blocklist = load_trie(path=BLOCKLIST_FILE, value="blocklist")
+        known_bad = load_trie(path=KNOWN_BAD_FEED, value="known-bad")
+        
+        # Sampled per-stage timings, shared by the capture and analysis path
+        self.latency = StageLatency(sample_every=LATENCY_SAMPLE_EVERY, enabled=LATENCY_TRACKING)
+        
+        # One flow id per src->dst pair, shared by the monitor's stats and
+        # the in-process analyzer's history
+        self.flows = FlowIndex(MAX_MONITOR_FLOWS, FLOW_IDLE_TIMEOUT)
+        
         # Initialize components
-        self.monitor = NetworkMonitor(interface=INTERFACE, on_packet_callback=self.on_packet)
-        self.analyzer = AIAnalyzer(threshold=ANOMALY_THRESHOLD)
+        self.monitor = NetworkMonitor(interface=INTERFACE, on_packet_callback=self.on_packet,
+                                      queue_size=CAPTURE_QUEUE_SIZE,
+                                      overflow_policy=CAPTURE_OVERFLOW_POLICY,
+                                      sample_rate=CAPTURE_SAMPLE_RATE,
+                                      bpf_filter=CAPTURE_FILTER,
+                                      snaplen=CAPTURE_SNAPLEN,
+                                      fast_path=FAST_CAPTURE,
+                                      replay_file=REPLAY_FILE,
+                                      replay_speed=REPLAY_SPEED,
+                                      top_talkers_capacity=TOP_TALKERS_CAPACITY,
+                                      cardinality_window=CARDINALITY_WINDOW,
+                                      latency=self.latency,
+                                      flows=self.flows)
+        self.analyzer = AIAnalyzer(threshold=ANOMALY_THRESHOLD,
+                                   history_window=HISTORY_WINDOW,
+                                   max_flows=MAX_TRACKED_FLOWS,
+                                   idle_timeout=FLOW_IDLE_TIMEOUT,
+                                   batch_size=ML_BATCH_SIZE,
+                                   batch_max_latency=ML_BATCH_MAX_LATENCY,
+                                   on_result=self.on_analysis,
+                                   blocklist=blocklist,
+                                   known_bad=known_bad,
+                                   model_path=MODEL_PATH,
+                                   feature_export_dir=None if ANALYSIS_WORKERS > 0 else FEATURE_EXPORT_DIR,
+                                   feature_rotate_seconds=FEATURE_ROTATE_SECONDS,
+                                   rules_path=SCORING_RULES_FILE,
+                                   rules_reload_interval=RULES_RELOAD_INTERVAL,
+                                   latency=self.latency,
+                                   flows=self.flows)
+        
+        # Optional multi-process analysis, sharded by flow
+        self.pipeline = None
+        if ANALYSIS_WORKERS > 0:
+            self.pipeline = ShardedAnalysisPipeline(
+                ANALYSIS_WORKERS,
+                on_result=self.on_analysis,
+                analyzer_kwargs={
+                    "threshold": ANOMALY_THRESHOLD,
+                    "history_window": HISTORY_WINDOW,
+                    "max_flows": MAX_TRACKED_FLOWS,
+                    "idle_timeout": FLOW_IDLE_TIMEOUT,
+                    "batch_size": ML_BATCH_SIZE,
+                    "batch_max_latency": ML_BATCH_MAX_LATENCY,
+                    "blocklist": blocklist,
+                    "known_bad": known_bad,
+                    "model_path": MODEL_PATH,
+                    "feature_export_dir": FEATURE_EXPORT_DIR,
+                    "feature_rotate_seconds": FEATURE_ROTATE_SECONDS,
+                    "rules_path": SCORING_RULES_FILE,
+                    "rules_reload_interval": RULES_RELOAD_INTERVAL
+                },
+                cooldown=ALERT_COOLDOWN,
+                max_sources=MAX_COOLDOWN_ENTRIES
+            )
+        
+        # Periodic refits on recent traffic, swapped in without a restart
+        self.retrainer = ModelRetrainer(self.analyzer, pipeline=self.pipeline,
+                                        interval=RETRAIN_INTERVAL, window=RETRAIN_WINDOW,
+                                        feature_dir=FEATURE_EXPORT_DIR,
+                                        holdout_fraction=RETRAIN_HOLDOUT,
+                                        max_anomaly_rate=RETRAIN_MAX_ANOMALY_RATE,
+                                        max_drift=RETRAIN_MAX_DRIFT,
+                                        drift_adopt_after=RETRAIN_DRIFT_ADOPT_AFTER)
+        
+        # Per-source scan / SYN-flood detectors; they see every packet, so they
+        # run here rather than in the flow-sharded analysis workers
+        self.scan_detector = None
+        if SCAN_DETECTION:
+            self.scan_detector = ScanDetector(window=SCAN_WINDOW, scan_targets=SCAN_TARGETS,
+                                              scan_hosts=SCAN_HOSTS,
+                                              syn_threshold=SYN_FLOOD_THRESHOLD,
+                                              syn_ratio=SYN_FLOOD_RATIO,
+                                              max_sources=MAX_SCAN_SOURCES)
         
         # Initialize firewall (real or simulated)
         if MODE == "active":
-            self.firewall = FirewallController(whitelist=WHITELIST_IPS, block_duration=BLOCK_DURATION)
-            # Initialize pf firewall
-            self.firewall.initialize_pf()
+            self.firewall = FirewallController(whitelist=whitelist, block_duration=BLOCK_DURATION,
+                                               backend=FIREWALL_BACKEND, batch_window=RULE_BATCH_WINDOW)
+            # Initialize firewall backend (pf / nftables / ipset)
+            self.firewall.initialize()
         else:
-            self.firewall = FirewallSimulator(whitelist=WHITELIST_IPS)
+            self.firewall = FirewallSimulator(whitelist=whitelist)
             print("[INFO] Running in MONITOR mode - no real blocking")
             
-        # Alert tracking for cooldown
-        self.alert_cooldown = {}
+        # Alert tracking for cooldown (batch-scored results arrive on the
+        # scorer's deadline thread as well as the sniff thread), in capture
+        # time nanoseconds; entries expire once their cooldown has passed
+        self.cooldown_ns = int(ALERT_COOLDOWN * 1_000_000_000)
+        self.alert_cooldown = FlowTable(MAX_COOLDOWN_ENTRIES, idle_timeout=self.cooldown_ns)
+        self.alert_lock = threading.Lock()
         
-    def on_packet(self, packet_info):
-        """Callback when packet is captured"""
-        # Analyze packet with AI
-        analysis = self.analyzer.analyze_packet(packet_info)
+        # Recent alerts for API clients, numbered so they can poll for new ones
+        self.recent_alerts = deque(maxlen=RECENT_ALERTS)
+        self.alert_seq = 0
+        self.alert_counts = defaultdict(int)  # severity: alerts raised
+        self.alerts_suppressed = 0
+        self.stop_event = threading.Event()
+        self.api = SOCApiServer(self, API_HOST, API_PORT) if API_PORT else None
         
+        # Persistent alert history
+        self.event_store = None
+        if EVENT_DB:
+            self.event_store = EventStore(EVENT_DB, batch_size=EVENT_BATCH_SIZE,
+                                          flush_interval=EVENT_FLUSH_INTERVAL)
+        
+    def on_packet(self, record):
+        """Callback for every captured packet (a packet_parser.PacketRecord)"""
+        latency = self.latency
+        if self.scan_detector:
+            if latency.active:
+                start = time.perf_counter_ns()
+            alert = self.scan_detector.observe(record)
+            if latency.active:
+                latency.record("scan_detector", start)
+            if alert is not None:
+                self.on_analysis(alert)
+                
+        if latency.active:
+            start = time.perf_counter_ns()
+        if self.pipeline:
+            self.pipeline.submit(record)  # Alerts return via on_analysis
+            if latency.active:
+                latency.record("pipeline_submit", start)
+            return
+            
+        # Analyze packet with AI (None while queued for batched ML scoring)
+        analysis = self.analyzer.analyze_packet(record)
+        if latency.active:
+            latency.record("analyze", start)
+        if analysis is not None:
+            self.on_analysis(analysis)
+            
+    def on_analysis(self, analysis):
+        """Callback for every finished analysis (inline or batch-scored)"""
         # Check if we should alert
         if analysis['threat_score'] >= 0.1:  # Only alert for non-info
-            src_ip = analysis['src_ip']
-            current_time = datetime.now()
+            record = analysis.pop('record')
+            now = record.ts_ns
+            # Detector alerts have their own cooldown, so an earlier per-packet
+            # alert from the same source can't hide a scan
+            detector = analysis.get('detector')
+            cooldown_key = (record.src, detector) if detector else record.src
+            
+            traced = self.latency.active
+            if traced:
+                start = time.perf_counter_ns()
             
             # Cooldown check
-            if src_ip in self.alert_cooldown:
-                time_diff = (current_time - self.alert_cooldown[src_ip]).total_seconds()
-                if time_diff < ALERT_COOLDOWN:
+            with self.alert_lock:
+                last_alert = self.alert_cooldown.get(cooldown_key)
+                if last_alert is not None and now - last_alert < self.cooldown_ns:
+                    self.alerts_suppressed += 1
+                    if traced:
+                        self.latency.record("cooldown", start)
                     return  # Skip alert due to cooldown
-                    
-            self.alert_cooldown[src_ip] = current_time
+                        
+                self.alert_cooldown.put(cooldown_key, now, now)
+                # Only now does the alert get its strings and datetime
+                analysis.update(record.alert_fields())
+                self.alert_seq += 1
+                analysis['seq'] = self.alert_seq
+                self.alert_counts[analysis['severity']] += 1
+                self.recent_alerts.append(analysis)
+            if traced:
+                self.latency.record("cooldown", start)
             
+            if self.event_store:
+                if traced:
+                    start = time.perf_counter_ns()
+                self.event_store.record(analysis)
+                if traced:
+                    self.latency.record("event_store", start)
+                
             # Add to GUI if running
             if hasattr(self, 'gui'):
+                if traced:
+                    start = time.perf_counter_ns()
                 self.gui.add_alert(analysis)
+                if traced:
+                    self.latency.record("gui_add_alert", start)
                 
+    def recent_alerts_after(self, seq):
+        """Alerts still in the recent buffer with a sequence number above seq"""
+        with self.alert_lock:
+            alerts = list(self.recent_alerts)
+        return [alert for alert in alerts if alert['seq'] > seq]
+        
+    def get_alert_stats(self):
+        # Repeats the workers dropped before sending them here count too
+        suppressed = self.pipeline.alerts_suppressed if self.pipeline else 0
+        with self.alert_lock:
+            return {"raised": self.alert_seq, "suppressed": self.alerts_suppressed + suppressed,
+                    "by_severity": dict(self.alert_counts)}
+        
     def train_ml(self):
         """Train ML model in background"""
-        print("[AI] Training ML model on traffic patterns...")
-        # Wait for some traffic first
-        import time
-        time.sleep(5)
-        self.analyzer.train_ml_model()
+        if self.analyzer.is_trained:
+            return  # Loaded from MODEL_PATH; no cold training needed
+        print("[AI] No saved model - training ML model on traffic patterns...")
+        # Wait for some traffic first, then keep retrying until enough flows
+        # have been seen to fit anything
+        while not self.stop_event.wait(5):
+            if self.pipeline:
+                if self.pipeline.is_trained:
+                    break
+                self.pipeline.train()  # Workers report back asynchronously
+            elif self.analyzer.train_ml_model(save=True):
+                break
+        else:
+            return
         print("[AI] ML training complete")
         
-    def run(self):
-        """Run the SOC analyst"""
+    def run(self, daemon=False):
+        """Run the SOC analyst with the dashboard, or headless if daemon"""
+        # Start analysis workers before packets arrive
+        if self.pipeline:
+            self.pipeline.start()
+            
         # Start network monitor
         if not self.monitor.start():
             print("[ERROR] Failed to start network monitor")
@@ -84,13 +276,47 @@ class FirewallSOCAnalyst:
         training_thread = threading.Thread(target=self.train_ml)
         training_thread.daemon = True
         training_thread.start()
+        self.retrainer.start()
         
-        # Start GUI
-        print("[GUI] Starting dashboard...")
-        self.gui = FirewallSOCGUI(self.monitor, self.analyzer, self.firewall)
+        if self.api:
+            self.api.start()
         
-        # Run GUI (blocks until closed)
-        self.gui.run()
+        try:
+            if daemon:
+                print("[DAEMON] Running headless - stop with SIGINT/SIGTERM")
+                if threading.current_thread() is threading.main_thread():
+                    for signum in (signal.SIGINT, signal.SIGTERM):
+                        signal.signal(signum, lambda *_: self.stop_event.set())
+                while not self.stop_event.wait(1):
+                    pass
+            else:
+                # Imported here so a headless sensor doesn't need Tk
+                from gui_dashboard import FirewallSOCGUI
+                print("[GUI] Starting dashboard...")
+                self.gui = FirewallSOCGUI(self.monitor, self.analyzer, self.firewall,
+                                          event_store=self.event_store, report_hours=REPORT_HOURS,
+                                          refresh_rate=REFRESH_RATE,
+                                          frame_interval=GUI_FRAME_INTERVAL,
+                                          latency=self.latency)
+                
+                # Run GUI (blocks until closed)
+                self.gui.run()
+        finally:
+            self.shutdown()
+            
+    def shutdown(self):
+        """Stop every component, flushing alerts and exported features"""
+        print("[INFO] Shutting down...")
+        if self.api:
+            self.api.stop()
+        self.monitor.stop()
+        self.retrainer.stop()
+        if self.pipeline:
+            self.pipeline.stop()
+        self.analyzer.close()
+        self.firewall.close()
+        if self.event_store:
+            self.event_store.close()
         
 def check_requirements():
     """Check if all requirements are met"""
@@ -119,6 +345,19 @@ def check_requirements():
     print("\n" + "=" * 60)
     
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Firewall AI SOC Analyst")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run headless; use the HTTP API for stats, alerts and blocking")
+    parser.add_argument("--connect", metavar="URL",
+                        help="only open the dashboard, as a client of a running daemon's API")
+    args = parser.parse_args()
+    
+    if args.connect:
+        from soc_client import run_dashboard
+        run_dashboard(args.connect, report_hours=REPORT_HOURS, refresh_rate=REFRESH_RATE,
+                      frame_interval=GUI_FRAME_INTERVAL)
+        sys.exit(0)
+    
     # Check requirements
     check_requirements()
     
@@ -126,9 +365,8 @@ if __name__ == "__main__":
     analyst = FirewallSOCAnalyst()
     
     try:
-        analyst.run()
+        analyst.run(daemon=args.daemon)
     except KeyboardInterrupt:
-        print("\n[INFO] Shutting down...")
         sys.exit(0)
     except Exception as e:
         print(f"[ERROR] {e}")
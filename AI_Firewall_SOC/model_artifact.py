@@ -0,0 +1,75 @@
+"""
+Versioned on-disk artifact for the trained anomaly model
+"""
+
+import os
+import pickle
+import time
+from datetime import datetime
+
+import numpy as np
+
+from flow_stats import FEATURE_NAMES, FEATURE_SCHEMA_VERSION
+
+ARTIFACT_VERSION = 1
+STATS_SAMPLE = 10000  # Vectors re-scored to measure the training anomaly rate
+
+
+def training_stats(model, features, seconds=None):
+    """Summary of the data a model was fitted on"""
+    features = np.asarray(features, dtype=np.float64)
+    sample = features[:STATS_SAMPLE]
+    return {
+        "samples": len(features),
+        "feature_mean": features.mean(axis=0).tolist(),
+        "feature_std": features.std(axis=0).tolist(),
+        "feature_min": features.min(axis=0).tolist(),
+        "feature_max": features.max(axis=0).tolist(),
+        "anomaly_rate": float((model.predict(sample) == -1).mean()),
+        "score_offset": float(getattr(model, "offset_", 0.0)),
+        "train_seconds": seconds
+    }
+
+
+def save_model(path, model, stats=None, **metadata):
+    """Write the model plus schema and training stats atomically"""
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "schema_version": FEATURE_SCHEMA_VERSION,
+        "feature_names": list(FEATURE_NAMES),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "stats": stats or {},
+        "model": model,
+    }
+    artifact.update(metadata)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return artifact
+
+
+def load_model(path):
+    """Artifact dict, or None if missing or incompatible with this build"""
+    if not path or not os.path.exists(path):
+        return None
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            artifact = pickle.load(f)
+    except Exception as e:
+        print(f"Could not load model from {path}: {e}")
+        return None
+    if not isinstance(artifact, dict) or artifact.get("version") != ARTIFACT_VERSION:
+        print(f"Ignoring model {path}: unsupported artifact format")
+        return None
+    if (artifact.get("schema_version") != FEATURE_SCHEMA_VERSION or
+            artifact.get("feature_names") != list(FEATURE_NAMES)):
+        print(f"Ignoring model {path}: feature schema {artifact.get('schema_version')} "
+              f"!= {FEATURE_SCHEMA_VERSION}")
+        return None
+    artifact["load_ms"] = (time.perf_counter() - start) * 1000
+    return artifact
@@ -0,0 +1,232 @@
+"""
+Periodic background retraining of the anomaly model
+"""
+
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from feature_export import load_features
+from flow_stats import FEATURE_COUNT
+from model_artifact import save_model, training_stats
+
+try:
+    from sklearn.ensemble import IsolationForest
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+MIN_SAMPLES = 200  # Don't refit on less than this many vectors
+
+
+def _lower_priority(nice, cpu):
+    """Runs in the training process before any work is done"""
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError:
+            pass
+
+
+def fit_candidate(recent, feature_dir, since, current_model, holdout_fraction=0.2,
+                  max_rows=500000, contamination=0.1, seed=None, previous_model=None):
+    """Fit a model on recent features and score it against a holdout.
+
+    The running model and the last candidate rejected for drift (if any)
+    are scored on the same holdout. Runs in the training process. Returns
+    (model, stats, report), or (None, None, report) when there isn't
+    enough data.
+    """
+    parts = [np.asarray(recent, dtype=np.float64).reshape(-1, FEATURE_COUNT)]
+    if feature_dir:
+        parts.append(load_features(feature_dir, since))
+    features = np.concatenate(parts)
+    features = features[np.isfinite(features).all(axis=1)]
+    report = {"samples": len(features)}
+    if len(features) < MIN_SAMPLES:
+        return None, None, report
+
+    rng = np.random.default_rng(seed)
+    if len(features) > max_rows:
+        features = features[rng.choice(len(features), max_rows, replace=False)]
+    order = rng.permutation(len(features))
+    split = int(len(features) * (1 - holdout_fraction))
+    train, holdout = features[order[:split]], features[order[split:]]
+
+    start = time.perf_counter()
+    model = IsolationForest(contamination=contamination, random_state=seed, n_jobs=1)
+    model.fit(train)
+    stats = training_stats(model, train, time.perf_counter() - start)
+
+    report["holdout"] = len(holdout)
+    report["candidate_rate"] = float((model.predict(holdout) == -1).mean())
+    if current_model is not None:
+        report["current_rate"] = float((current_model.predict(holdout) == -1).mean())
+    if previous_model is not None:
+        report["previous_rate"] = float((previous_model.predict(holdout) == -1).mean())
+    return model, stats, report
+
+
+class ModelRetrainer:
+    """Refits the model on a sliding window of recent flow features.
+
+    Every ``interval`` seconds the analyzer's live flow features (plus any
+    exported feature segments from the last ``window`` seconds) are sent to
+    a fresh low-priority process (niced, single-threaded, pinned to one
+    CPU) which fits a candidate model and scores it on a holdout split.
+    The candidate replaces the running model only if its holdout anomaly
+    rate stays within ``max_anomaly_rate`` and the running model flags no
+    more than ``max_drift`` times its own training anomaly rate on the same
+    holdout. A candidate always looks clean on the data it was fitted to,
+    so the second check is what stops a window dominated by attack traffic
+    from being learned as normal.
+
+    A lasting change in traffic would fail that check forever, so drift
+    rejections are tracked: when ``drift_adopt_after`` windows in a row
+    drift and each one also looks normal to the candidate rejected before
+    it, the shift is treated as the new baseline and the candidate is
+    adopted. An attack that keeps changing shape never builds a streak.
+    The swap is a single reference assignment in the analyzer (and a
+    message to each pipeline worker).
+    """
+
+    def __init__(self, analyzer, pipeline=None, interval=3600, window=86400, feature_dir=None,
+                 holdout_fraction=0.2, max_anomaly_rate=0.2, max_drift=2.0, drift_adopt_after=3,
+                 max_rows=500000, contamination=0.1, nice=19, cpu=None):
+        self.analyzer = analyzer
+        self.pipeline = pipeline
+        self.interval = interval
+        self.window = window
+        self.feature_dir = feature_dir
+        self.holdout_fraction = holdout_fraction
+        self.max_anomaly_rate = max_anomaly_rate
+        self.max_drift = max_drift
+        self.drift_adopt_after = drift_adopt_after
+        self.max_rows = max_rows
+        self.contamination = contamination
+        self.nice = nice
+        # Default to the last CPU, away from the capture/analysis threads
+        self.cpu = cpu if cpu is not None else max((os.cpu_count() or 1) - 1, 0)
+        self.runs = 0
+        self.swaps = 0
+        self.rejected = 0
+        self.drift_streak = 0  # Consecutive, mutually consistent drift rejections
+        self._drift_candidate = None  # (model, training anomaly rate) of the last one
+        self.last_report = None
+        self.running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not SKLEARN_AVAILABLE or not self.interval:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.retrain()
+            except Exception as e:
+                print(f"[AI] Retraining failed: {e}")
+
+    def retrain(self):
+        """Fit, validate and (if it passes) install one candidate model"""
+        self.runs += 1
+        recent = self.analyzer.flow_features()
+        since = time.time() - self.window if self.window else None
+        previous = self._drift_candidate[0] if self._drift_candidate else None
+        context = mp.get_context("spawn")  # Never fork the capture process's threads
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_lower_priority,
+                                 initargs=(self.nice, self.cpu)) as executor:
+            future = executor.submit(fit_candidate, recent, self.feature_dir, since,
+                                     self.analyzer.isolation_forest, self.holdout_fraction,
+                                     self.max_rows, self.contamination, self.runs, previous)
+            model, stats, report = future.result()
+        self.last_report = report
+
+        if model is None:
+            print(f"[AI] Retraining skipped: only {report['samples']} feature vectors")
+            return False
+        reason = self._reject_reason(report)
+        if reason is None and self._drifted(report):
+            reason = self._track_drift(model, stats, report)
+        else:
+            self.drift_streak = 0
+            self._drift_candidate = None
+        if reason:
+            self.rejected += 1
+            report["rejected"] = reason
+            print(f"[AI] Rejected retrained model: {reason}")
+            return False
+
+        info = {"created": datetime.now().isoformat(timespec="seconds"), "stats": stats,
+                "source": "retrain", "holdout": report}
+        if self.analyzer.model_path:
+            try:
+                info = save_model(self.analyzer.model_path, model, stats, source="retrain",
+                                  holdout=report)
+            except OSError as e:
+                print(f"Could not save model to {self.analyzer.model_path}: {e}")
+        self.drift_streak = 0
+        self._drift_candidate = None
+        self.analyzer.install_model(model, info)
+        if self.pipeline:
+            self.pipeline.install_model(model, info)
+        self.swaps += 1
+        print(f"[AI] Swapped in retrained model ({stats['samples']} vectors, holdout anomaly "
+              f"rate {report['candidate_rate']:.1%})")
+        return True
+
+    def _reject_reason(self, report):
+        """Why a candidate is unusable on its own holdout, or None"""
+        if report["candidate_rate"] > self.max_anomaly_rate:
+            return (f"holdout anomaly rate {report['candidate_rate']:.1%} > "
+                    f"{self.max_anomaly_rate:.1%}")
+        return None
+
+    def _drifted(self, report):
+        """True if the running model finds the recent holdout anomalous"""
+        if "current_rate" not in report:
+            return False
+        # What the running model flagged on the data it was fitted to
+        info = self.analyzer.model_info or {}
+        baseline = info.get("stats", {}).get("anomaly_rate") or self.contamination
+        report["current_baseline"] = baseline
+        return report["current_rate"] > baseline * self.max_drift
+
+    def _track_drift(self, model, stats, report):
+        """Extend or restart the drift streak; None once the shift is adopted"""
+        if (self._drift_candidate is not None and "previous_rate" in report and
+                report["previous_rate"] <= self._drift_candidate[1] * self.max_drift):
+            self.drift_streak += 1  # Same shifted traffic as last window
+        else:
+            self.drift_streak = 1
+        report["drift_streak"] = self.drift_streak
+        if self.drift_adopt_after and self.drift_streak >= self.drift_adopt_after:
+            print(f"[AI] Traffic has stayed shifted for {self.drift_streak} refits; "
+                  f"adopting it as the new baseline")
+            return None
+        self._drift_candidate = (model, stats["anomaly_rate"] or self.contamination)
+        return (f"recent traffic has drifted from the running model, which flags "
+                f"{report['current_rate']:.1%} of the holdout vs {report['current_baseline']:.1%} "
+                f"at training (drift streak {self.drift_streak}/{self.drift_adopt_after or 'off'})")
+
+    def get_stats(self):
+        return {"runs": self.runs, "swaps": self.swaps, "rejected": self.rejected,
+                "drift_streak": self.drift_streak, "last_report": self.last_report}
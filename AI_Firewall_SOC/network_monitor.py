@@ -2,31 +2,54 @@
 Network traffic monitor using Scapy
 """
 
+import select
 import threading
 import time
-from collections import defaultdict
-from datetime import datetime
+from time import perf_counter_ns
+
+from capture_queue import BoundedCaptureQueue, DROP_OLDEST
+from packet_parser import PacketRecord, parse_frame, linktype_for_layer, format_ip, ip_value
+from pcap_replay import PcapReplaySource
+from flow_table import FlowIndex, flow_endpoints
+from sketches import SpaceSaving, WindowedCardinality
+from latency import StageLatency
 
 try:
-    from scapy.all import sniff, IP, TCP, UDP, ICMP
+    from scapy.all import conf, sniff, IP, TCP, UDP
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
     print("Scapy not installed. Run: pip3 install scapy")
 
 class NetworkMonitor:
-    def __init__(self, interface="en0", on_packet_callback=None):
+    def __init__(self, interface="en0", on_packet_callback=None,
+                 queue_size=65536, overflow_policy=DROP_OLDEST, sample_rate=10,
+                 bpf_filter=None, snaplen=128, fast_path=False,
+                 replay_file=None, replay_speed=0,
+                 max_flows=100000, idle_timeout=300,
+                 top_talkers_capacity=1000, cardinality_window=60, latency=None, flows=None):
         self.interface = interface
         self.on_packet_callback = on_packet_callback
+        self.bpf_filter = bpf_filter or None
+        self.snaplen = snaplen
+        self.fast_path = fast_path
+        # Offline source: stream a pcap instead of sniffing the interface
+        self.replay = PcapReplaySource(replay_file, replay_speed) if replay_file else None
+        self.packets_processed = 0
         self.running = False
         self.sniffer_thread = None
-        self.packet_stats = defaultdict(lambda: {
-            "count": 0,
-            "bytes": 0,
-            "protocols": defaultdict(int),
-            "first_seen": None,
-            "last_seen": None
-        })
+        self.analysis_thread = None
+        # Capture only enqueues; analysis drains on its own thread
+        self.capture_queue = BoundedCaptureQueue(queue_size, overflow_policy, sample_rate)
+        # Per-connection ids and stats, shared with the analyzer when passed
+        # in; idle and least-recently-seen flows are evicted
+        self.flows = flows if flows is not None else FlowIndex(max_flows, idle_timeout)
+        self.total_packets = 0
+        # Fixed-size summaries the dashboard reads instead of scanning flows
+        self.top_connections = SpaceSaving(top_talkers_capacity)
+        self.top_sources = SpaceSaving(top_talkers_capacity)
+        self.cardinality = WindowedCardinality(cardinality_window)
+        self.latency = latency or StageLatency()  # Sampled per-stage timings
         
     def start(self):
         """Start packet capture"""
@@ -35,10 +58,35 @@ class NetworkMonitor:
             return False
             
         self.running = True
-        self.sniffer_thread = threading.Thread(target=self._capture_packets)
+        handler = self._process_frame if self.fast_path else self._process_packet
+        if self.replay:
+            capture = self._replay_capture
+        elif self.fast_path:
+            capture = self._capture_raw
+        else:
+            capture = self._capture_packets
+        self.sniffer_thread = threading.Thread(target=capture)
         self.sniffer_thread.daemon = True
         self.sniffer_thread.start()
-        print(f"Started monitoring on {self.interface}")
+        self.analysis_thread = threading.Thread(target=self._drain_queue, args=(handler,))
+        self.analysis_thread.daemon = True
+        self.analysis_thread.start()
+        if self.replay:
+            print(f"Replaying {self.replay.path}")
+        else:
+            print(f"Started monitoring on {self.interface}")
+        return True
+        
+    def wait(self, timeout=None):
+        """Block until a replay has been read and fully analysed"""
+        deadline = time.monotonic() + timeout if timeout else None
+        if self.sniffer_thread:
+            self.sniffer_thread.join(timeout)
+        queue = self.capture_queue
+        while self.running and self.packets_processed < queue.delivered():
+            if deadline and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
         return True
         
     def stop(self):
@@ -46,6 +94,8 @@ class NetworkMonitor:
         self.running = False
         if self.sniffer_thread:
             self.sniffer_thread.join(timeout=2)
+        if self.analysis_thread:
+            self.analysis_thread.join(timeout=2)
         print("Stopped monitoring")
         
     def _capture_packets(self):
@@ -53,70 +103,174 @@ class NetworkMonitor:
         try:
             sniff(
                 iface=self.interface,
-                prn=self._process_packet,
+                filter=self.bpf_filter,
+                prn=self._enqueue_packet,
                 store=False,
                 stop_filter=lambda x: not self.running
             )
         except Exception as e:
             print(f"Error capturing packets: {e}")
             
+    def _capture_raw(self):
+        """Capture only the first snaplen bytes of each frame, undissected"""
+        try:
+            sock = conf.L2listen(iface=self.interface, filter=self.bpf_filter)
+        except Exception as e:
+            print(f"Error opening capture socket: {e}")
+            return
+            
+        linktypes = {}
+        put = self.capture_queue.put
+        try:
+            while self.running:
+                # Poll so stop() is honoured on a quiet link
+                if not select.select([sock], [], [], 0.5)[0]:
+                    continue
+                layer, data, timestamp = sock.recv_raw(self.snaplen)
+                if data is None:
+                    continue
+                linktype = linktypes.get(layer)
+                if linktype is None:
+                    linktype = linktypes[layer] = linktype_for_layer(layer)
+                put((data, linktype, int(timestamp * 1e9) if timestamp else None, None))
+        except Exception as e:
+            print(f"Error capturing packets: {e}")
+        finally:
+            sock.close()
+            
+    def _replay_capture(self):
+        """Feed a capture file into the queue, waiting rather than dropping"""
+        queue = self.capture_queue
+        latency = self.latency
+        try:
+            for frame in self.replay.frames(lambda: self.running):
+                # Offline sources can wait, so apply backpressure instead of shedding
+                while len(queue) >= queue.capacity and self.running:
+                    time.sleep(0.0005)
+                if self.fast_path:
+                    queue.put(frame)
+                else:
+                    data, linktype, ts_ns, _ = frame
+                    # Dissection happens here (inside sniff() for live capture)
+                    traced = latency.enabled and self.replay.packets_read % latency.sample_every == 0
+                    if traced:
+                        start = perf_counter_ns()
+                    packet = conf.l2types.get(linktype, conf.raw_layer)(data)
+                    if traced:
+                        latency.record("dissect", start)
+                    packet.time = ts_ns / 1e9
+                    queue.put(packet)
+        except Exception as e:
+            print(f"Error replaying {self.replay.path}: {e}")
+        print(f"Replay finished: {self.replay.packets_read} packets")
+            
+    def _enqueue_packet(self, packet):
+        """Sniff callback: hand the packet off without analysing it"""
+        self.capture_queue.put(packet)
+        
+    def _drain_queue(self, handler):
+        """Feed queued packets to analysis until stopped"""
+        queue = self.capture_queue
+        latency = self.latency
+        while self.running:
+            packet = queue.get()
+            if packet is None:
+                time.sleep(0.001)
+                continue
+            traced = latency.enabled and self.packets_processed % latency.sample_every == 0
+            if traced:
+                latency.active = True
+                start = perf_counter_ns()
+            try:
+                handler(packet)
+            except Exception as e:
+                print(f"Error processing packet: {e}")
+            if traced:
+                latency.record("packet_total", start)
+                latency.active = False
+            self.packets_processed += 1
+                
     def _process_packet(self, packet):
         """Process individual packet"""
         if not self.running:
             return
             
         # Extract packet info
+        traced = self.latency.active
+        if traced:
+            start = perf_counter_ns()
         info = self._extract_packet_info(packet)
-        if not info:
+        if traced:
+            self.latency.record("extract", start)
+        if info:
+            self._record_packet(info)
+            
+    def _process_frame(self, frame):
+        """Process a raw (data, linktype, ts_ns, wirelen) frame"""
+        if not self.running:
             return
             
-        # Update statistics
-        key = f"{info['src_ip']}->{info['dst_ip']}"
-        stats = self.packet_stats[key]
-        stats["count"] += 1
-        stats["bytes"] += len(packet)
-        stats["protocols"][info["protocol"]] += 1
-        if stats["first_seen"] is None:
-            stats["first_seen"] = info["timestamp"]
-        stats["last_seen"] = info["timestamp"]
+        data, linktype, ts_ns, wirelen = frame
+        traced = self.latency.active
+        if traced:
+            start = perf_counter_ns()
+        info = parse_frame(data, linktype, ts_ns, wirelen)
+        if traced:
+            self.latency.record("parse", start)
+        if info:
+            self._record_packet(info)
+            
+    def _record_packet(self, record):
+        """Update statistics and hand the PacketRecord to the callback"""
+        traced = self.latency.active
+        if traced:
+            start = perf_counter_ns()
+        # Update statistics (per-flow counters live in the FlowIndex)
+        flows = self.flows
+        flow = flows.observe(record)
+        self.total_packets += 1
+        self.top_connections.add(flows.keys[flow])
+        self.top_sources.add(record.src)
+        self.cardinality.add(record.src, record.dst, record.ts_ns * 1e-9)
+        if traced:
+            self.latency.record("monitor_stats", start)
         
         # Call callback
         if self.on_packet_callback:
-            self.on_packet_callback(info)
+            self.on_packet_callback(record)
             
     def _extract_packet_info(self, packet):
-        """Extract relevant info from packet"""
-        info = {
-            "timestamp": datetime.now(),
-            "src_ip": None,
-            "dst_ip": None,
-            "protocol": "Unknown",
-            "src_port": None,
-            "dst_port": None,
-            "size": len(packet) if packet else 0
-        }
+        """Build a PacketRecord from a dissected packet (None if not IPv4)"""
+        if IP not in packet:
+            return None
+        ip = packet[IP]
+        src_port = dst_port = tcp_flags = None
+        if TCP in packet:
+            tcp = packet[TCP]
+            src_port, dst_port, tcp_flags = tcp.sport, tcp.dport, int(tcp.flags)
+        elif UDP in packet:
+            src_port, dst_port = packet[UDP].sport, packet[UDP].dport
+        ts_ns = int(packet.time * 1_000_000_000)  # packet.time may be a Decimal
+        return PacketRecord(ts_ns, ip_value(ip.src), ip_value(ip.dst), ip.proto,
+                            src_port, dst_port, tcp_flags, len(packet))
         
-        if IP in packet:
-            info["src_ip"] = packet[IP].src
-            info["dst_ip"] = packet[IP].dst
-            
-            if TCP in packet:
-                info["protocol"] = "TCP"
-                info["src_port"] = packet[TCP].sport
-                info["dst_port"] = packet[TCP].dport
-            elif UDP in packet:
-                info["protocol"] = "UDP"
-                info["src_port"] = packet[UDP].sport
-                info["dst_port"] = packet[UDP].dport
-            elif ICMP in packet:
-                info["protocol"] = "ICMP"
-                
-        return info if info["src_ip"] and info["dst_ip"] else None
+    def get_statistics(self, top=10):
+        """Get current statistics (O(top), independent of the number of flows)"""
+        return {
+            "top_connections": [(self._format_flow(key), count, error)
+                                for key, count, error in self.top_connections.top(top)],
+            "top_sources": [(format_ip(src), count, error)
+                            for src, count, error in self.top_sources.top(top)],
+            "distinct": self.cardinality.get_stats(),
+            "capture": self.capture_queue.get_stats(),
+            "flows": self.flows.get_stats()
+        }
         
-    def get_statistics(self):
-        """Get current statistics"""
-        return dict(self.packet_stats)
+    @staticmethod
+    def _format_flow(key):
+        src, dst = flow_endpoints(key)
+        return f"{format_ip(src)}->{format_ip(dst)}"
         
     def get_total_packets(self):
         """Get total packet count"""
-        return sum(stats["count"] for stats in self.packet_stats.values())
+        return self.total_packets
@@ -0,0 +1,179 @@
+"""
+Header-only packet parsing straight from raw frame bytes
+"""
+
+import socket
+import struct
+import time
+from datetime import datetime
+
+# pcap link-layer types
+LINKTYPE_NULL = 0  # BSD loopback (macOS lo0)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101  # Bare IP
+LINKTYPE_LINUX_SLL = 113  # Linux "any" interface
+
+ETH_P_IP = 0x0800
+ETH_VLAN_TAGS = (0x8100, 0x88A8)
+
+IP_PROTOCOLS = {1: "ICMP", 6: "TCP", 17: "UDP"}
+
+_u16 = struct.Struct("!H")
+_u32 = struct.Struct("!I")
+_ports = struct.Struct("!HH")
+_inet_ntoa = socket.inet_ntoa
+_time_ns = time.time_ns
+
+
+def format_ip(value):
+    """Dotted-quad string for an IPv4 address held as an int"""
+    return _inet_ntoa(value.to_bytes(4, "big"))
+
+
+def ip_value(ip):
+    """IPv4 string to the int form PacketRecord uses"""
+    return _u32.unpack(socket.inet_aton(ip))[0]
+
+
+class PacketRecord:
+    """What the monitor emits for each IPv4 packet.
+
+    Every field is an int (or None for a missing port / flag): ``ts_ns`` is
+    the capture time in nanoseconds since the epoch, taken from the capture
+    header when there is one; ``src`` / ``dst`` are the IPv4 addresses and
+    ``proto`` the IP protocol number. ``flow`` is the flow's id in the
+    monitor's flow_table.FlowIndex, once it has been counted there.
+    Strings and datetimes are only built by the properties below, for the
+    few packets that become alerts.
+    """
+
+    __slots__ = ("ts_ns", "src", "dst", "proto", "src_port", "dst_port", "tcp_flags", "size",
+                 "flow")
+
+    def __init__(self, ts_ns, src, dst, proto, src_port=None, dst_port=None,
+                 tcp_flags=None, size=0):
+        self.ts_ns = ts_ns
+        self.src = src
+        self.dst = dst
+        self.proto = proto
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.tcp_flags = tcp_flags
+        self.size = size
+        self.flow = None
+
+    def __reduce__(self):
+        # A plain tuple pickles smaller and faster than the default slots state;
+        # the flow id is local to the process's FlowIndex, so it isn't sent
+        return PacketRecord, (self.ts_ns, self.src, self.dst, self.proto, self.src_port,
+                              self.dst_port, self.tcp_flags, self.size)
+
+    def __repr__(self):
+        return (f"PacketRecord({self.src_ip}:{self.src_port} -> {self.dst_ip}:{self.dst_port} "
+                f"{self.protocol} {self.size}B @ {self.ts_ns})")
+
+    @property
+    def timestamp(self):
+        return datetime.fromtimestamp(self.ts_ns / 1e9)
+
+    @property
+    def src_ip(self):
+        return format_ip(self.src)
+
+    @property
+    def dst_ip(self):
+        return format_ip(self.dst)
+
+    @property
+    def protocol(self):
+        return IP_PROTOCOLS.get(self.proto, "Unknown")
+
+    def alert_fields(self):
+        """Display fields an alert carries (timestamp, endpoints, protocol, port)"""
+        return {
+            "timestamp": self.timestamp,
+            "src_ip": self.src_ip,
+            "dst_ip": self.dst_ip,
+            "protocol": self.protocol,
+            "dst_port": self.dst_port
+        }
+
+
+def linktype_for_layer(layer):
+    """Map the scapy link-layer class a socket reports to a pcap linktype"""
+    name = getattr(layer, "__name__", "")
+    if name == "Ether":
+        return LINKTYPE_ETHERNET
+    if name in ("Loopback", "Null"):
+        return LINKTYPE_NULL
+    if name == "CookedLinux":
+        return LINKTYPE_LINUX_SLL
+    return LINKTYPE_RAW
+
+
+def _ip_offset(data, linktype):
+    """Offset of the IPv4 header in a frame, or None if it isn't IPv4"""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        offset = 12
+        ethertype = _u16.unpack_from(data, offset)[0]
+        while ethertype in ETH_VLAN_TAGS and len(data) >= offset + 6:
+            offset += 4
+            ethertype = _u16.unpack_from(data, offset)[0]
+        return offset + 2 if ethertype == ETH_P_IP else None
+    if linktype == LINKTYPE_RAW:
+        return 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16 or _u16.unpack_from(data, 14)[0] != ETH_P_IP:
+            return None
+        return 16
+    if linktype == LINKTYPE_NULL:
+        # Address family in host byte order; AF_INET is 2 everywhere
+        if len(data) < 4 or (data[0] != 2 and data[3] != 2):
+            return None
+        return 4
+    return None
+
+
+def parse_frame(data, linktype=LINKTYPE_ETHERNET, ts_ns=None, wirelen=None):
+    """Build the same PacketRecord as NetworkMonitor._extract_packet_info.
+
+    Only the IPv4 and TCP/UDP headers are read, so ``data`` can be a frame
+    truncated to a small snaplen. ``ts_ns`` is the capture header's
+    timestamp in nanoseconds (the current time if there is none).
+    ``wirelen`` is the original frame length when the capture source knows
+    it; otherwise it is derived from the IP total-length field. Returns
+    None for anything that isn't IPv4.
+    """
+    offset = _ip_offset(data, linktype)
+    if offset is None or len(data) < offset + 20:
+        return None
+
+    first = data[offset]
+    if first >> 4 != 4:
+        return None
+    header_len = (first & 0x0F) * 4
+
+    if wirelen is None:
+        wirelen = offset + _u16.unpack_from(data, offset + 2)[0]
+
+    src_port = dst_port = tcp_flags = None
+    ip_proto = data[offset + 9]
+    if _u16.unpack_from(data, offset + 6)[0] & 0x1FFF == 0:  # First (or only) fragment
+        transport = offset + header_len
+        if ip_proto in (6, 17) and len(data) >= transport + 4:
+            src_port, dst_port = _ports.unpack_from(data, transport)
+            if ip_proto == 6 and len(data) > transport + 13:
+                tcp_flags = data[transport + 13]
+
+    return PacketRecord(
+        ts_ns or _time_ns(),
+        _u32.unpack_from(data, offset + 12)[0],
+        _u32.unpack_from(data, offset + 16)[0],
+        ip_proto,
+        src_port,
+        dst_port,
+        tcp_flags,
+        wirelen
+    )
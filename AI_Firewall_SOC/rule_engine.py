@@ -0,0 +1,235 @@
+"""
+Declarative threat-scoring rules compiled into lookup tables
+"""
+
+import bisect
+import json
+import os
+import threading
+
+from packet_parser import IP_PROTOCOLS
+
+PORT_TABLE_SIZE = 65536
+SIZE_TABLE_SIZE = 65536  # Packet sizes at or above this share the last entry
+
+# Reproduces the original hard-coded factors; used when no rule file exists
+DEFAULT_RULES = {
+    "rules": [
+        {"name": "attack_ports", "type": "port", "weight": 0.3,
+         "ports": {"22": "SSH", "23": "Telnet", "3389": "RDP", "445": "SMB",
+                   "1433": "MSSQL", "3306": "MySQL", "5900": "VNC", "8080": "Proxy"}},
+        {"name": "sensitive_ports", "type": "port", "weight": 0.0,
+         "ports": [22, 3389, 445], "reason": "Sensitive port {port} access"},
+        {"name": "high_rate", "type": "rate", "above": 100, "weight": 0.4},
+        {"name": "ml_anomaly", "type": "anomaly", "weight": 0.3},
+        {"name": "icmp", "type": "protocol", "protocols": ["ICMP"], "weight": 0.2},
+        {"name": "small_packets", "type": "size", "below": 100, "weight": 0.1},
+        {"name": "blocklist", "type": "reputation", "match": "blocklist", "weight": 1.0,
+         "reason": "Blocklisted address"},
+        {"name": "known_bad", "type": "reputation", "match": "known-bad", "weight": 0.5,
+         "reason": "Known-bad address (threat feed)"}
+    ]
+}
+
+
+def severity_for(score):
+    """Convert a 0-1 threat score to a severity level"""
+    if score >= 0.8:
+        return "CRITICAL"
+    elif score >= 0.6:
+        return "HIGH"
+    elif score >= 0.3:
+        return "MEDIUM"
+    elif score >= 0.1:
+        return "LOW"
+    else:
+        return "INFO"
+
+
+def _check_port(port):
+    if not 0 <= port < PORT_TABLE_SIZE:
+        raise ValueError(f"Port {port} out of range 0-{PORT_TABLE_SIZE - 1}")
+    return port
+
+
+def _parse_ports(spec):
+    """Yield ports from a list of ints / "a-b" ranges, or the keys of a dict"""
+    for item in spec:
+        if isinstance(item, str) and "-" in item.strip()[1:]:  # A leading "-" is a sign
+            low, high = item.split("-", 1)
+            low, high = _check_port(int(low)), _check_port(int(high))
+            if low > high:
+                raise ValueError(f"Empty port range {item!r}")
+            yield from range(low, high + 1)
+        else:
+            yield _check_port(int(item))
+
+
+_PROTOCOL_NUMBERS = {name: number for number, name in IP_PROTOCOLS.items()}
+
+
+def _protocol_number(protocol):
+    """IP protocol number for a rule's protocol name ("ICMP") or number (1)"""
+    if isinstance(protocol, str) and not protocol.isdigit():
+        try:
+            return _PROTOCOL_NUMBERS[protocol.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown protocol {protocol!r}; use its IP protocol number")
+    number = int(protocol)
+    if not 0 <= number <= 255:
+        raise ValueError(f"Protocol number {number} out of range 0-255")
+    return number
+
+
+class CompiledRules:
+    """Immutable lookup tables built from a rule set.
+
+    Scoring a packet is a fixed sequence of lookups: the 65536-entry port
+    and size tables, a protocol dict, a bisect over the sorted rate
+    thresholds and two constants. Several rules of one type are folded
+    into the same table at compile time, so the number of rules doesn't
+    change the per-packet cost.
+    """
+
+    __slots__ = ("port_weights", "port_reasons", "size_weights", "protocol_weights",
+                 "rate_thresholds", "rate_weights", "rate_reasons", "anomaly_weight",
+                 "reputation_weights", "reputation_reasons", "rule_count")
+
+    def __init__(self, config):
+        port_weights = [0.0] * PORT_TABLE_SIZE
+        size_weights = [0.0] * SIZE_TABLE_SIZE
+        self.port_reasons = {}  # port: [reason template]
+        self.protocol_weights = {}
+        rate_rules = []
+        self.anomaly_weight = 0.0
+        self.reputation_weights = {}
+        self.reputation_reasons = {}
+
+        rules = config.get("rules", [])
+        for rule in rules:
+            kind = rule.get("type")
+            weight = float(rule.get("weight", 0.0))
+            reason = rule.get("reason")
+            if kind == "port":
+                for port in _parse_ports(rule.get("ports", [])):
+                    port_weights[port] += weight
+                    if reason:
+                        self.port_reasons.setdefault(port, []).append(reason)
+            elif kind == "size":
+                low = max(int(rule.get("min", 0)), 0)
+                high = min(int(rule.get("below", SIZE_TABLE_SIZE)), SIZE_TABLE_SIZE)
+                for size in range(low, high):
+                    size_weights[size] += weight
+            elif kind == "protocol":
+                for protocol in rule.get("protocols", []):
+                    number = _protocol_number(protocol)
+                    self.protocol_weights[number] = self.protocol_weights.get(number, 0.0) + weight
+            elif kind == "rate":
+                rate_rules.append((float(rule["above"]), weight, reason))
+            elif kind == "anomaly":
+                self.anomaly_weight += weight
+            elif kind == "reputation":
+                match = rule["match"]
+                self.reputation_weights[match] = self.reputation_weights.get(match, 0.0) + weight
+                if reason:
+                    self.reputation_reasons.setdefault(match, []).append(reason)
+            else:
+                raise ValueError(f"Unknown rule type {kind!r} in rule {rule.get('name')}")
+
+        self.port_weights = port_weights
+        self.size_weights = size_weights
+
+        # Rate rules: weight of "rate > threshold" summed over every
+        # threshold passed, so one bisect gives the total
+        rate_rules.sort(key=lambda r: r[0])
+        self.rate_thresholds = [threshold for threshold, _, _ in rate_rules]
+        self.rate_weights = [0.0]
+        self.rate_reasons = [[]]
+        for _, weight, reason in rate_rules:
+            self.rate_weights.append(self.rate_weights[-1] + weight)
+            self.rate_reasons.append(self.rate_reasons[-1] + ([reason] if reason else []))
+        self.rule_count = len(rules)
+
+    def score(self, port, protocol, size, rate, anomaly, reputation):
+        """Sum of matching rule weights, capped at 1.0 (protocol is the IP protocol number)"""
+        # Same term order as the original if-chain, so float sums match exactly
+        score = 0.0
+        if port is not None:
+            score += self.port_weights[port]
+        if rate is not None:
+            score += self.rate_weights[bisect.bisect_left(self.rate_thresholds, rate)]
+        if anomaly:
+            score += self.anomaly_weight
+        score += self.protocol_weights.get(protocol, 0.0)
+        score += self.size_weights[size if size < SIZE_TABLE_SIZE else SIZE_TABLE_SIZE - 1]
+        if reputation is not None:
+            score += self.reputation_weights.get(reputation, 0.0)
+        return min(score, 1.0)
+
+    def reasons(self, port, rate, reputation):
+        """(reputation reasons, other reasons) for the rules a packet matched"""
+        lead = self.reputation_reasons.get(reputation, []) if reputation else []
+        other = []
+        if port is not None and port in self.port_reasons:
+            other.extend(r.format(port=port) for r in self.port_reasons[port])
+        if rate is not None and self.rate_thresholds:
+            index = bisect.bisect_left(self.rate_thresholds, rate)
+            other.extend(r.format(rate=rate) for r in self.rate_reasons[index])
+        return lead, other
+
+
+class ScoringRules:
+    """Loads, compiles and (optionally) hot-reloads a JSON rule file.
+
+    ``current`` always points at a fully built CompiledRules; a reload
+    compiles the new tables first and then swaps the reference, so scoring
+    never sees a half-loaded rule set. A file that fails to parse keeps the
+    previous rules in place.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.current = CompiledRules(DEFAULT_RULES)
+        self.reloads = 0
+        self._mtime = None
+        self._stop = threading.Event()
+        if path:
+            self.reload()
+
+    def reload(self):
+        """Recompile from the rule file; returns False if it couldn't be loaded"""
+        if not self.path:
+            return False
+        if not os.path.exists(self.path):
+            print(f"Scoring rules file {self.path} not found; using "
+                  f"{'the previous' if self.reloads else 'the built-in'} rules")
+            return False
+        try:
+            self._mtime = os.path.getmtime(self.path)  # Don't retry a bad file until it changes
+            with open(self.path) as f:
+                compiled = CompiledRules(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"Could not load scoring rules from {self.path}: {e}")
+            return False
+        self.current = compiled
+        self.reloads += 1
+        print(f"Loaded {compiled.rule_count} scoring rules from {self.path}")
+        return True
+
+    def watch(self, interval=5):
+        """Reload automatically whenever the rule file changes"""
+        thread = threading.Thread(target=self._watch_loop, args=(interval,))
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self.reload()
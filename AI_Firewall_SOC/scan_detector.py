@@ -0,0 +1,155 @@
+"""
+Per-source port-scan and SYN-flood detection over sliding time windows
+"""
+
+import math
+
+from flow_table import FlowTable
+from rule_engine import severity_for
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+BITMAP_BITS = 1024  # Linear-counting bitmap per source; accurate to a few thousand distinct
+_BITMAP_MASK = BITMAP_BITS - 1
+
+
+def _bitmap_count(bits):
+    """Linear-counting estimate of the distinct items hashed into a bitmap"""
+    zeros = BITMAP_BITS - bits.bit_count()
+    if zeros == 0:
+        zeros = 1  # Saturated; report the largest estimate the bitmap can give
+    return round(BITMAP_BITS * math.log(BITMAP_BITS / zeros))
+
+
+class SourceWindow:
+    """Counters for one source: the current half-window and the one before"""
+
+    __slots__ = ("start", "targets", "hosts", "syn", "syn_ack",
+                 "prev_targets", "prev_hosts", "prev_syn", "prev_syn_ack", "quiet_until")
+
+    def __init__(self, start):
+        self.start = start
+        self.targets = self.hosts = self.syn = self.syn_ack = 0
+        self.prev_targets = self.prev_hosts = self.prev_syn = self.prev_syn_ack = 0
+        self.quiet_until = 0.0  # No new alert for this source before this time
+
+    def advance(self, now, half):
+        """Roll the half-windows forward so ``now`` falls in the current one"""
+        elapsed = now - self.start
+        if elapsed < half:
+            return
+        if elapsed < 2 * half:
+            self.prev_targets, self.prev_hosts = self.targets, self.hosts
+            self.prev_syn, self.prev_syn_ack = self.syn, self.syn_ack
+        else:
+            self.prev_targets = self.prev_hosts = self.prev_syn = self.prev_syn_ack = 0
+        self.targets = self.hosts = self.syn = self.syn_ack = 0
+        self.start += elapsed // half * half
+
+
+class ScanDetector:
+    """Flags sources that sweep many (host, port) targets or flood SYNs.
+
+    Every source gets a SourceWindow holding two half-windows of
+    ``window / 2`` seconds; the detectors look at their union, a sliding
+    window of between ``window / 2`` and ``window`` seconds, rotated by
+    packet time so pcap replays behave like live capture. Distinct
+    (dst, port) targets and distinct destination hosts are counted in
+    fixed BITMAP_BITS bitmaps (linear counting), so a source costs a few
+    hundred bytes whatever it sends, and at most ``max_sources`` sources are
+    tracked (idle and least recently seen ones are evicted).
+
+    - Port scan: more than ``scan_targets`` distinct (dst, port) pairs
+      probed by bare SYNs (TCP) or any UDP packet; reported as horizontal
+      when they span more than ``scan_hosts`` hosts.
+    - SYN flood: more than ``syn_threshold`` bare SYNs with fewer than one
+      SYN-ACK back per ``syn_ratio`` SYNs.
+
+    observe() returns an alert shaped like AIAnalyzer's analyses (or None),
+    so alerts go through the same cooldown, event store and dashboard.
+    """
+
+    def __init__(self, window=10, scan_targets=100, scan_hosts=20, syn_threshold=200,
+                 syn_ratio=3.0, max_sources=10000, scan_score=0.9, flood_score=0.9):
+        self.window = window
+        self.half = window / 2
+        self.scan_targets = scan_targets
+        self.scan_hosts = scan_hosts
+        self.syn_threshold = syn_threshold
+        self.syn_ratio = syn_ratio
+        self.scan_score = scan_score
+        self.flood_score = flood_score
+        self.sources = FlowTable(max_sources, idle_timeout=window)  # src: SourceWindow
+        self.packets = 0
+        self.alerts = {"port_scan": 0, "syn_flood": 0}
+
+    def observe(self, record):
+        """Account one PacketRecord; returns an alert dict when a detector fires"""
+        self.packets += 1
+        src = record.src
+        dst = record.dst
+        now = record.ts_ns * 1e-9
+        flags = record.tcp_flags
+
+        if flags is not None and flags & (TCP_SYN | TCP_ACK) == TCP_SYN | TCP_ACK:
+            # A SYN-ACK answers the handshake its destination started
+            state = self.sources.get(dst)
+            if state is not None:
+                state.advance(now, self.half)
+                state.syn_ack += 1
+            return None
+
+        state = self.sources.touch(src, now, lambda: SourceWindow(now))
+        state.advance(now, self.half)
+        syn = flags is not None and flags & (TCP_SYN | TCP_ACK) == TCP_SYN
+        if syn:
+            state.syn += 1
+        # Only connection attempts are targets: a server answering clients'
+        # ephemeral ports (TCP with ACK set) would otherwise look like a scan
+        if flags is None or syn:
+            # Addresses are ints and hash to themselves, so hash a tuple to
+            # spread strided sweeps (10.0.0.1, 10.0.1.1, ...) over the bitmap
+            state.hosts |= 1 << (hash((dst,)) & _BITMAP_MASK)
+            port = record.dst_port
+            if port is not None:
+                state.targets |= 1 << (hash((dst, port)) & _BITMAP_MASK)
+
+        if now < state.quiet_until:
+            return None
+        # Plain counter and popcount checks first; the log() estimate only near a threshold
+        syn = state.syn + state.prev_syn
+        if syn > self.syn_threshold:
+            syn_ack = state.syn_ack + state.prev_syn_ack
+            if syn > syn_ack * self.syn_ratio:
+                return self._alert(record, state, now, "syn_flood", self.flood_score,
+                                   f"SYN flood: {syn} SYNs, {syn_ack} SYN-ACKs "
+                                   f"in {self.window}s")
+        targets = state.targets | state.prev_targets
+        if targets.bit_count() > self.scan_targets // 2:
+            distinct = _bitmap_count(targets)
+            if distinct > self.scan_targets:
+                hosts = _bitmap_count(state.hosts | state.prev_hosts)
+                kind = "Horizontal port scan" if hosts > self.scan_hosts else "Port scan"
+                return self._alert(record, state, now, "port_scan", self.scan_score,
+                                   f"{kind}: ~{distinct} targets on ~{hosts} hosts "
+                                   f"in {self.window}s")
+        return None
+
+    def _alert(self, record, state, now, kind, score, reason):
+        state.quiet_until = now + self.window  # One alert per source per window
+        self.alerts[kind] += 1
+        return {
+            "threat_score": score,
+            "severity": severity_for(score),
+            "reasons": [reason],
+            "record": record,
+            "detector": kind
+        }
+
+    def get_stats(self):
+        stats = self.sources.get_stats()
+        stats["packets"] = self.packets
+        stats["port_scan_alerts"] = self.alerts["port_scan"]
+        stats["syn_flood_alerts"] = self.alerts["syn_flood"]
+        return stats
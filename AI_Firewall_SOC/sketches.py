@@ -0,0 +1,158 @@
+"""
+Fixed-size streaming sketches: Space-Saving heavy hitters and HyperLogLog
+"""
+
+import heapq
+import math
+
+_MASK64 = (1 << 64) - 1
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in O(capacity) memory (Metwally et al.).
+
+    Tracks at most ``capacity`` items. An untracked item replaces the one
+    with the smallest count and inherits that count as its error bound, so
+    every reported count overestimates the true count by at most ``error``
+    and any item with more than total/capacity occurrences is guaranteed to
+    be tracked. Hits on tracked items are a single dict update; the minimum
+    is found through a min-heap whose stale entries are fixed up lazily.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}  # item: count
+        self.errors = {}  # item: overestimation bound
+        self.total = 0
+        self._heap = []  # (count when pushed, item); may be stale
+
+    def add(self, item, weight=1):
+        self.total += weight
+        counts = self.counts
+        count = counts.get(item)
+        if count is not None:
+            counts[item] = count + weight
+            return
+        if len(counts) < self.capacity:
+            counts[item] = weight
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (weight, item))
+            return
+
+        # Evict the current minimum, refreshing stale heap entries on the way
+        heap = self._heap
+        while True:
+            pushed, victim = heap[0]
+            current = counts[victim]
+            if current == pushed:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        del self.errors[victim]
+        counts[item] = current + weight
+        self.errors[item] = current
+        heapq.heapreplace(heap, (current + weight, item))
+
+    def top(self, k=10):
+        """[(item, count, error)] for the k largest counts"""
+        while True:
+            try:
+                counts = dict(self.counts)
+                errors = dict(self.errors)
+                break
+            except RuntimeError:
+                continue  # Updated mid-copy by the capture thread; retry
+        items = heapq.nlargest(k, counts.items(), key=lambda entry: entry[1])
+        return [(item, count, errors.get(item, 0)) for item, count in items]
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision bytes (~1.04/sqrt(m) error).
+
+    Uses Python's (SipHash) hash(), so estimates are only comparable
+    within one process.
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._rank_bits = 64 - precision
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, item):
+        if item.__class__ is int:
+            item = item.to_bytes(16, "little")  # hash(int) is the int itself; hash the bytes
+        h = hash(item) & _MASK64
+        index = h >> self._rank_bits
+        rest = h & ((1 << self._rank_bits) - 1)
+        rank = self._rank_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        registers = self.registers
+        m = self.m
+        estimate = self._alpha * m * m / sum(2.0 ** -r for r in registers)
+        if estimate <= 2.5 * m:
+            zeros = registers.count(0)
+            if zeros:
+                return round(m * math.log(m / zeros))  # Linear counting for small sets
+        return round(estimate)
+
+    def merge(self, other):
+        """Fold another sketch of the same precision into this one"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def clear(self):
+        self.registers = bytearray(self.m)
+
+    def __len__(self):
+        return self.count()
+
+
+class WindowedCardinality:
+    """Distinct sources and destinations per fixed time window.
+
+    Keeps one HyperLogLog pair for the window in progress and one for the
+    last complete window, rotated by packet timestamp (so replays window
+    the same way live capture does).
+    """
+
+    def __init__(self, window=60, precision=12):
+        self.window = window
+        self.precision = precision
+        self.window_start = None
+        self.sources = HyperLogLog(precision)
+        self.destinations = HyperLogLog(precision)
+        self.previous = None  # (start, distinct sources, distinct destinations)
+
+    def add(self, src, dst, timestamp):
+        if self.window_start is None:
+            self.window_start = timestamp
+        elif timestamp - self.window_start >= self.window:
+            self._rotate(timestamp)
+        self.sources.add(src)
+        self.destinations.add(dst)
+
+    def _rotate(self, timestamp):
+        self.previous = (self.window_start, self.sources.count(), self.destinations.count())
+        self.sources = HyperLogLog(self.precision)
+        self.destinations = HyperLogLog(self.precision)
+        # Align to the window grid even if whole windows passed without traffic
+        elapsed = (timestamp - self.window_start) // self.window * self.window
+        self.window_start += elapsed
+
+    def get_stats(self):
+        stats = {
+            "window": self.window,
+            "sources": self.sources.count(),
+            "destinations": self.destinations.count(),
+        }
+        if self.previous:
+            stats["previous_sources"] = self.previous[1]
+            stats["previous_destinations"] = self.previous[2]
+        return stats
@@ -0,0 +1,351 @@
+"""
+Local HTTP API and Prometheus metrics for a running SOC analyst
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from latency import PERCENTILES
+
+MAX_BODY = 65536  # Largest request body accepted (block/unblock are tiny)
+REQUEST_TIMEOUT = 10  # Seconds a client gets to send its request
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()  # numpy scalars
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def _param(query, name, default=None, cast=str):
+    values = query.get(name)
+    if not values or values[0] == "":
+        return default
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise ApiError(400, f"Invalid value for {name!r}: {values[0]!r}")
+
+
+class SOCApiServer:
+    """asyncio HTTP/1.1 server exposing a FirewallSOCAnalyst.
+
+    Runs its own event loop on a daemon thread, so capture and analysis
+    never wait on API clients. Handlers only read counters and snapshots
+    the analyst already keeps (O(1) or O(k) each); the one potentially slow
+    call, an alert-history query, runs in the loop's thread pool. Every
+    response closes its connection.
+
+    GET  /stats            counters from every component
+    GET  /top?k=10         top talkers and distinct-host counts
+    GET  /alerts?after=N   live alerts newer than sequence number N
+    GET  /alerts/history   stored alerts (since, until, src_ip, severity, limit)
+    GET  /alerts/summary   stored alerts per severity (since, until)
+    GET  /blocked          currently blocked IPs
+    POST /block            {"ip": ..., "reason": ...}
+    POST /unblock          {"ip": ...}
+    GET  /latency          per-stage latency summaries
+    POST /latency          {"enabled": bool, "reset": bool}
+    GET  /metrics          Prometheus text exposition
+    """
+
+    def __init__(self, analyst, host="127.0.0.1", port=8787):
+        self.analyst = analyst
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.started = time.time()
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._routes = {
+            ("GET", "/stats"): self.get_stats,
+            ("GET", "/top"): self.get_top,
+            ("GET", "/alerts"): self.get_alerts,
+            ("GET", "/alerts/history"): self.get_alert_history,
+            ("GET", "/alerts/summary"): self.get_alert_summary,
+            ("GET", "/blocked"): self.get_blocked,
+            ("POST", "/block"): self.post_block,
+            ("POST", "/unblock"): self.post_unblock,
+            ("GET", "/latency"): self.get_latency,
+            ("POST", "/latency"): self.post_latency,
+            ("GET", "/metrics"): self.get_metrics,
+        }
+
+    def start(self):
+        """Start serving in the background; returns False if the port can't be bound"""
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        if self._server is None:
+            return False
+        print(f"[API] Listening on http://{self.host}:{self.port}")
+        return True
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]  # Resolves port 0
+        except OSError as e:
+            print(f"[API] Could not listen on {self.host}:{self.port}: {e}")
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            status, content_type, body = await asyncio.wait_for(
+                self._respond(reader), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            return
+        header = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                  f"Content-Type: {content_type}\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  "Connection: close\r\n\r\n")
+        try:
+            writer.write(header.encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader):
+        """Parse one request and return (status, content type, body bytes)"""
+        self.requests += 1
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) != 3:
+                raise ApiError(400, "Malformed request line")
+            method, target, _ = request_line
+            length = 0
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            if length > MAX_BODY:
+                raise ApiError(413, "Request body too large")
+            payload = await reader.readexactly(length) if length else b""
+
+            url = urlsplit(target)
+            handler = self._routes.get((method, url.path))
+            if handler is None:
+                if any(path == url.path for _, path in self._routes):
+                    raise ApiError(405, f"{method} not allowed on {url.path}")
+                raise ApiError(404, f"No such endpoint: {url.path}")
+            query = parse_qs(url.query)
+            if method == "POST":
+                try:
+                    data = json.loads(payload or b"{}")
+                except ValueError:
+                    raise ApiError(400, "Body must be JSON")
+                result = await self._loop.run_in_executor(None, handler, data)
+            else:
+                result = await self._loop.run_in_executor(None, handler, query)
+        except ApiError as e:
+            return e.status, "application/json", json.dumps({"error": str(e)}).encode()
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, "application/json", json.dumps({"error": str(e)}).encode()
+        except Exception as e:
+            print(f"[API] Request failed: {e}")
+            return 500, "application/json", json.dumps({"error": "internal error"}).encode()
+
+        if isinstance(result, str):
+            return 200, "text/plain; version=0.0.4; charset=utf-8", result.encode()
+        return 200, "application/json", json.dumps(result, default=_json_default).encode()
+
+    # Handlers (run in the loop's thread pool)
+
+    def get_stats(self, query):
+        analyst = self.analyst
+        monitor_stats = analyst.monitor.get_statistics()
+        stats = {
+            "uptime": time.time() - self.started,
+            "packets": analyst.monitor.get_total_packets(),
+            "capture": monitor_stats["capture"],
+            "monitor_flows": monitor_stats["flows"],
+            "analyzer_flows": analyst.analyzer.get_flow_stats(),
+            "distinct": monitor_stats["distinct"],
+            "blocking": analyst.firewall.get_block_stats(),
+            "alerts": analyst.get_alert_stats(),
+            "model": {"trained": analyst.analyzer.is_trained, **(analyst.analyzer.model_info or {})},
+            "event_store": analyst.event_store.get_stats() if analyst.event_store else None,
+            "scan_detector": analyst.scan_detector.get_stats() if analyst.scan_detector else None,
+            "retrainer": analyst.retrainer.get_stats(),
+        }
+        return stats
+
+    def get_top(self, query):
+        top = _param(query, "k", 10, int)
+        stats = self.analyst.monitor.get_statistics(top=min(max(top, 1), 1000))
+        return {key: stats[key] for key in ("top_connections", "top_sources", "distinct")}
+
+    def get_alerts(self, query):
+        after = _param(query, "after", 0, int)
+        limit = _param(query, "limit", 100, int)
+        alerts = self.analyst.recent_alerts_after(after)[-limit:]
+        return {"alerts": alerts, "last": alerts[-1]["seq"] if alerts else after}
+
+    def _require_store(self):
+        store = self.analyst.event_store
+        if store is None:
+            raise ApiError(404, "Alert history is disabled (EVENT_DB = None)")
+        store.flush()
+        return store
+
+    def get_alert_history(self, query):
+        store = self._require_store()
+        return {"alerts": store.query(start=_param(query, "since", None, float),
+                                      end=_param(query, "until", None, float),
+                                      src_ip=_param(query, "src_ip"),
+                                      severity=_param(query, "severity"),
+                                      limit=min(_param(query, "limit", 1000, int), 100000))}
+
+    def get_alert_summary(self, query):
+        store = self._require_store()
+        return {"severity_counts": store.severity_counts(start=_param(query, "since", None, float),
+                                                         end=_param(query, "until", None, float))}
+
+    def get_blocked(self, query):
+        return {"blocked": self.analyst.firewall.get_blocked_ips()}
+
+    def post_block(self, data):
+        ip = data.get("ip")
+        if not ip:
+            raise ApiError(400, "Missing 'ip'")
+        blocked = self.analyst.firewall.block_ip(ip, data.get("reason") or "Blocked via API")
+        return {"ip": ip, "blocked": bool(blocked)}
+
+    def post_unblock(self, data):
+        ip = data.get("ip")
+        if not ip:
+            raise ApiError(400, "Missing 'ip'")
+        return {"ip": ip, "unblocked": bool(self.analyst.firewall.unblock_ip(ip))}
+
+    def get_latency(self, query):
+        latency = self.analyst.latency
+        return {"enabled": latency.enabled, "sample_every": latency.sample_every,
+                "stages": latency.get_stats()}
+
+    def post_latency(self, data):
+        latency = self.analyst.latency
+        if "enabled" in data:
+            latency.set_enabled(data["enabled"])
+        if data.get("reset"):
+            latency.reset()
+        return self.get_latency({})
+
+    def get_metrics(self, query):
+        stats = self.get_stats(query)
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP soc_{name} {help_text}")
+            lines.append(f"# TYPE soc_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"soc_{name}{{{label_text}}} {value}" if label_text
+                             else f"soc_{name} {value}")
+
+        capture = stats["capture"]
+        metric("uptime_seconds", "gauge", "Seconds since the API started", [({}, stats["uptime"])])
+        metric("packets_total", "counter", "Packets analysed", [({}, stats["packets"])])
+        metric("capture_enqueued_total", "counter", "Packets offered to the capture queue",
+               [({}, capture["enqueued"])])
+        metric("capture_dropped_total", "counter", "Packets dropped by the capture queue",
+               [({}, capture["dropped"])])
+        metric("capture_queue_depth", "gauge", "Packets waiting in the capture queue",
+               [({}, capture["depth"])])
+        metric("capture_queue_high_watermark", "gauge", "Deepest the capture queue has been",
+               [({}, capture["high_watermark"])])
+        tables = (("monitor", stats["monitor_flows"]), ("analyzer", stats["analyzer_flows"]))
+        metric("flows", "gauge", "Flows currently tracked",
+               [({"table": name}, flows["flows"]) for name, flows in tables])
+        metric("flows_evicted_total", "counter", "Flows evicted from a flow table",
+               [({"table": name, "reason": reason}, flows[f"evicted_{reason}"])
+                for name, flows in tables for reason in ("idle", "capacity")])
+        distinct = stats["distinct"]
+        metric("distinct_hosts", "gauge",
+               f"Approximate distinct hosts in the current {distinct['window']}s window",
+               [({"direction": "source"}, distinct["sources"]),
+                ({"direction": "destination"}, distinct["destinations"])])
+        alerts = stats["alerts"]
+        metric("alerts_total", "counter", "Alerts raised after cooldown",
+               [({"severity": severity}, count) for severity, count in alerts["by_severity"].items()])
+        metric("alerts_suppressed_total", "counter", "Alerts suppressed by the cooldown",
+               [({}, alerts["suppressed"])])
+        blocking = stats["blocking"]
+        metric("blocked_ips", "gauge", "IPs currently blocked", [({}, blocking["active_blocks"])])
+        metric("blocks_total", "counter", "IPs blocked since start", [({}, blocking["total_blocked"])])
+        metric("model_trained", "gauge", "1 once an anomaly model is loaded",
+               [({}, int(bool(stats["model"]["trained"])))])
+        retrainer = stats["retrainer"]
+        metric("retrain_runs_total", "counter", "Background model refits",
+               [({"result": "swapped"}, retrainer["swaps"]),
+                ({"result": "rejected"}, retrainer["rejected"])])
+        metric("retrain_drift_streak", "gauge",
+               "Refits in a row rejected for the same traffic drift",
+               [({}, retrainer["drift_streak"])])
+        store = stats["event_store"]
+        if store:
+            metric("event_store_written_total", "counter", "Alerts committed to the history DB",
+                   [({}, store["written"])])
+            metric("event_store_dropped_total", "counter", "Alerts dropped by the history writer",
+                   [({}, store["dropped"])])
+        detector = stats["scan_detector"]
+        if detector:
+            metric("detector_alerts_total", "counter", "Scan / flood detector alerts",
+                   [({"detector": "port_scan"}, detector["port_scan_alerts"]),
+                    ({"detector": "syn_flood"}, detector["syn_flood_alerts"])])
+        stages = self.analyst.latency.get_stats()
+        if stages:
+            samples = []
+            for stage, s in stages.items():
+                for q in PERCENTILES:
+                    samples.append(({"stage": stage, "quantile": f"{q / 100:g}"},
+                                    s[f"p{q:g}_us"] / 1e6))
+            metric("stage_latency_seconds", "summary", "Sampled per-stage latency", samples)
+            lines.extend(f'soc_stage_latency_seconds_count{{stage="{stage}"}} {s["count"]}'
+                         for stage, s in stages.items())
+            lines.extend(f'soc_stage_latency_seconds_sum{{stage="{stage}"}} '
+                         f'{s["mean_us"] * s["count"] / 1e6}' for stage, s in stages.items())
+        metric("api_requests_total", "counter", "HTTP API requests served", [({}, self.requests)])
+        return "\n".join(lines) + "\n"
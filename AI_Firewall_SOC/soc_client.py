@@ -0,0 +1,193 @@
+"""
+Dashboard client for a SOC daemon's HTTP API
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from latency import format_table
+
+STATS_TTL = 0.25  # Seconds one /stats response serves the dashboard's several reads
+
+
+def _parse_alert(alert):
+    alert["timestamp"] = datetime.fromisoformat(alert["timestamp"])
+    return alert
+
+
+class SOCApiClient:
+    """Thin JSON client for soc_api.SOCApiServer"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._stats = None
+        self._stats_time = 0.0
+        self._lock = threading.Lock()
+
+    def request(self, path, params=None, body=None):
+        url = self.url + path
+        if params:
+            url += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(url, data=data, headers={"Content-Type": "application/json"},
+                          method="POST" if data is not None else "GET")
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            raise RuntimeError(f"{path}: {json.loads(e.read()).get('error', e.reason)}")
+
+    def stats(self):
+        """/stats, cached for STATS_TTL so one dashboard refresh is one request"""
+        with self._lock:
+            if self._stats is None or time.time() - self._stats_time > STATS_TTL:
+                self._stats = self.request("/stats")
+                self._stats_time = time.time()
+            return self._stats
+
+    def alerts_after(self, seq):
+        result = self.request("/alerts", {"after": seq})
+        return [_parse_alert(alert) for alert in result["alerts"]], result["last"]
+
+
+class RemoteMonitor:
+    """NetworkMonitor's dashboard-facing methods, served by the daemon"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_total_packets(self):
+        return self.client.stats()["packets"]
+
+    def get_statistics(self, top=10):
+        stats = self.client.stats()
+        result = self.client.request("/top", {"k": top})
+        result["capture"] = stats["capture"]
+        result["flows"] = stats["monitor_flows"]
+        return result
+
+    def stop(self):
+        pass  # Closing the dashboard leaves the daemon running
+
+
+class RemoteAnalyzer:
+    def __init__(self, client):
+        self.client = client
+
+    def get_flow_stats(self):
+        return self.client.stats()["analyzer_flows"]
+
+
+class RemoteFirewall:
+    def __init__(self, client):
+        self.client = client
+
+    def block_ip(self, ip, reason=""):
+        return self.client.request("/block", body={"ip": ip, "reason": reason})["blocked"]
+
+    def unblock_ip(self, ip):
+        return self.client.request("/unblock", body={"ip": ip})["unblocked"]
+
+    def get_blocked_ips(self):
+        return self.client.request("/blocked")["blocked"]
+
+    def get_block_stats(self):
+        return self.client.stats()["blocking"]
+
+
+class RemoteEventStore:
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _epoch(value):
+        return value.timestamp() if isinstance(value, datetime) else value
+
+    def flush(self):
+        pass  # The daemon flushes before answering history queries
+
+    def query(self, start=None, end=None, src_ip=None, severity=None, limit=1000):
+        result = self.client.request("/alerts/history", {
+            "since": self._epoch(start), "until": self._epoch(end),
+            "src_ip": src_ip, "severity": severity, "limit": limit})
+        return [_parse_alert(alert) for alert in result["alerts"]]
+
+    def severity_counts(self, start=None, end=None):
+        return self.client.request("/alerts/summary", {
+            "since": self._epoch(start), "until": self._epoch(end)})["severity_counts"]
+
+    def get_stats(self):
+        return self.client.stats()["event_store"]
+
+
+class RemoteLatency:
+    """StageLatency's dashboard-facing methods, served by the daemon"""
+
+    def __init__(self, client):
+        self.client = client
+        self.enabled = client.request("/latency")["enabled"]
+
+    def set_enabled(self, enabled):
+        self.enabled = self.client.request("/latency", body={"enabled": bool(enabled)})["enabled"]
+
+    def reset(self):
+        self.client.request("/latency", body={"reset": True})
+
+    def get_stats(self):
+        result = self.client.request("/latency")
+        self.enabled = result["enabled"]
+        return result["stages"]
+
+    def format_table(self):
+        stats = self.get_stats()
+        return format_table(stats, self.enabled)
+
+
+def follow_alerts(client, on_alert, stop, interval=0.5):
+    """Poll /alerts from a background thread, handing each new alert to on_alert"""
+    def loop():
+        seq = client.stats()["alerts"]["raised"]  # Only alerts raised from now on
+        while not stop.is_set():
+            try:
+                alerts, seq = client.alerts_after(seq)
+                for alert in alerts:
+                    on_alert(alert)
+            except (URLError, OSError, RuntimeError) as e:
+                print(f"[GUI] Alert poll failed: {e}")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=loop)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def run_dashboard(url, report_hours=24, refresh_rate=1, frame_interval=0.1):
+    """Open the Tk dashboard against a running daemon"""
+    from gui_dashboard import FirewallSOCGUI
+
+    client = SOCApiClient(url)
+    try:
+        stats = client.stats()
+    except (URLError, OSError) as e:
+        print(f"[ERROR] Cannot reach SOC daemon at {url}: {e}")
+        return False
+    print(f"[GUI] Connected to {url}")
+    event_store = RemoteEventStore(client) if stats["event_store"] is not None else None
+    gui = FirewallSOCGUI(RemoteMonitor(client), RemoteAnalyzer(client), RemoteFirewall(client),
+                         event_store=event_store, report_hours=report_hours,
+                         refresh_rate=refresh_rate, frame_interval=frame_interval,
+                         latency=RemoteLatency(client))
+    stop = threading.Event()
+    follow_alerts(client, gui.add_alert, stop)
+    try:
+        gui.run()
+    finally:
+        stop.set()
+    return True
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are flat files in AI_Firewall_SOC, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,151 @@
+"""
+window_features / burst_rate / RollingFlowStats against the original per-flow list formulas
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from flow_history import FlowHistoryStore
+from flow_stats import FEATURE_WINDOW, window_features, burst_rate
+
+
+def baseline_features(history):
+    """AIAnalyzer._extract_features as it was on plain lists of packets"""
+    if len(history) < 20:
+        return None
+    recent = history[-20:]
+    packet_rates = []
+    bytes_per_packet = []
+    for i in range(1, len(recent)):
+        time_diff = recent[i]["timestamp"] - recent[i - 1]["timestamp"]
+        if time_diff > 0 and time_diff < 1:
+            packet_rates.append(1.0 / time_diff)
+        bytes_per_packet.append(recent[i].get("size", 0))
+    return [
+        np.mean(packet_rates) if packet_rates else 0,
+        np.std(packet_rates) if len(packet_rates) > 1 else 0,
+        np.mean(bytes_per_packet) if bytes_per_packet else 0,
+        len(set(p.get("dst_port", 0) for p in recent))
+    ]
+
+
+def baseline_rate(history):
+    """The original packet-rate (DoS) factor's rate, or None"""
+    if len(history) <= 10:
+        return None
+    recent = history[-10:]
+    time_span = recent[-1]["timestamp"] - recent[0]["timestamp"]
+    if time_span > 0:
+        return len(recent) / time_span
+    return None
+
+
+def random_flow(rng, length):
+    """Packets with a mix of sub-second, zero, exactly-1s and multi-second gaps"""
+    packets = []
+    now = 1700000000.0
+    ports = [rng.choice([22, 80, 443, None]) for _ in range(3)] + [rng.randrange(1, 65536)]
+    for _ in range(length):
+        now += rng.choice([0.0, 1.0, rng.uniform(0.0001, 0.999), rng.uniform(1, 5)])
+        packets.append({"timestamp": now, "size": rng.randrange(40, 1500),
+                        "dst_port": rng.choice(ports)})
+    return packets
+
+
+@pytest.mark.parametrize("window", [FEATURE_WINDOW, 200])
+@pytest.mark.parametrize("seed", range(5))
+def test_window_features_match_baseline(seed, window):
+    rng = random.Random(seed)
+    flows = [random_flow(rng, rng.randrange(FEATURE_WINDOW, 250)) for _ in range(200)]
+
+    # Every flow goes through the ring buffer the analyzer uses
+    store = FlowHistoryStore(window=window, max_flows=len(flows))
+    for flow, packets in enumerate(flows):
+        for p in packets:
+            store.append(flow, p["timestamp"], p["size"], p["dst_port"])
+
+    features = window_features(*store.windows(store.full_slots(FEATURE_WINDOW), FEATURE_WINDOW))
+    expected = np.array([baseline_features(packets) for packets in flows], dtype=np.float64)
+    np.testing.assert_allclose(features, expected, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_burst_rate_matches_baseline(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        packets = random_flow(rng, rng.randrange(1, 40))
+        store = FlowHistoryStore(window=200, max_flows=1)
+        for p in packets:
+            slot = store.append(0, p["timestamp"], p["size"], p["dst_port"])
+        window = store.recent_slot(slot, FEATURE_WINDOW)
+        rate = burst_rate(window[0], int(store.counts[slot]))
+        expected = baseline_rate(packets)
+        if expected is None:
+            assert rate is None
+        else:
+            assert rate == pytest.approx(expected, rel=1e-9)
+
+
+def test_short_flows_have_no_features():
+    rng = random.Random(0)
+    packets = random_flow(rng, FEATURE_WINDOW - 1)
+    assert baseline_features(packets) is None
+    store = FlowHistoryStore(window=200, max_flows=1)
+    for p in packets:
+        store.append(0, p["timestamp"], p["size"], p["dst_port"])
+    assert len(store.full_slots(FEATURE_WINDOW)) == 0
+
+
+def test_reused_flow_id_starts_empty():
+    rng = random.Random(1)
+    store = FlowHistoryStore(window=FEATURE_WINDOW, max_flows=1)
+    for p in random_flow(rng, 50):
+        store.append(0, p["timestamp"], p["size"], p["dst_port"])
+    store.forget(0)  # FlowIndex evicted the flow; id 0 goes to the next one
+    assert 0 not in store and len(store.full_slots(FEATURE_WINDOW)) == 0
+
+    packets = random_flow(rng, FEATURE_WINDOW + 3)
+    for p in packets:
+        store.append(0, p["timestamp"], p["size"], p["dst_port"])
+    features = window_features(*store.windows([0], FEATURE_WINDOW))
+    np.testing.assert_allclose(features[0], baseline_features(packets), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rolling_stats_match_batch_formulas(seed):
+    rng = random.Random(seed)
+    store = FlowHistoryStore(window=FEATURE_WINDOW, max_flows=4, rolling=True)
+
+    # Four flow ids, each used by two flows in turn (FlowIndex recycles ids),
+    # with their packets interleaved
+    pending = {flow: random_flow(rng, rng.randrange(1, 120)) + [None] +
+               random_flow(rng, rng.randrange(1, 120)) for flow in range(4)}
+    seen = {flow: [] for flow in pending}
+    while pending:
+        flow = rng.choice(list(pending))
+        packet = pending[flow].pop(0)
+        if not pending[flow]:
+            del pending[flow]
+        if packet is None:
+            store.forget(flow)
+            seen[flow] = []
+            continue
+        seen[flow].append(packet)
+        store.append(flow, packet["timestamp"], packet["size"], packet["dst_port"])
+
+        rolling = store.rolling[flow]
+        expected_rate = baseline_rate(seen[flow])
+        if expected_rate is None:
+            assert rolling.burst_rate is None
+        else:
+            assert rolling.burst_rate == pytest.approx(expected_rate, rel=1e-9)
+
+        expected = baseline_features(seen[flow])
+        if expected is None:
+            assert rolling.features() is None
+            continue
+        batch = window_features(*store.windows([flow], FEATURE_WINDOW))[0]
+        np.testing.assert_allclose(rolling.features(), batch, rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(rolling.features(), expected, rtol=1e-6, atol=1e-6)
@@ -0,0 +1,101 @@
+"""
+ModelRetrainer must not swap in a model fitted to traffic the running model finds
+anomalous, unless that traffic has become the lasting norm
+"""
+
+import numpy as np
+import pytest
+
+from flow_stats import FEATURE_COUNT
+from model_artifact import training_stats
+from model_retrainer import ModelRetrainer
+
+sklearn = pytest.importorskip("sklearn.ensemble")
+
+
+class StubAnalyzer:
+    """The parts of AIAnalyzer the retrainer touches"""
+
+    def __init__(self, model, features):
+        self.isolation_forest = model
+        self.model_info = {"stats": training_stats(model, features)}
+        self.model_path = None
+        self.recent = None
+
+    def flow_features(self):
+        return self.recent
+
+    def install_model(self, model, info=None):
+        self.isolation_forest = model
+        self.model_info = info
+
+
+@pytest.fixture
+def analyzer():
+    rng = np.random.default_rng(0)
+    normal = rng.normal(size=(2000, FEATURE_COUNT))
+    model = sklearn.IsolationForest(contamination=0.1, random_state=0).fit(normal)
+    return StubAnalyzer(model, normal)
+
+
+def retrainer_for(analyzer):
+    return ModelRetrainer(analyzer, interval=0, window=0, drift_adopt_after=3, cpu=0)
+
+
+def shifted(seed, loc=4.0):
+    return np.random.default_rng(seed).normal(loc=loc, size=(2000, FEATURE_COUNT))
+
+
+def test_candidate_on_shifted_traffic_is_rejected(analyzer):
+    current = analyzer.isolation_forest
+    analyzer.recent = shifted(1)
+    retrainer = retrainer_for(analyzer)
+
+    assert not retrainer.retrain()
+    assert retrainer.rejected == 1
+    assert analyzer.isolation_forest is current
+    report = retrainer.last_report
+    # The candidate looks fine on its own data; only the comparison catches it
+    assert report["candidate_rate"] <= retrainer.max_anomaly_rate
+    assert report["current_rate"] > report["current_baseline"] * retrainer.max_drift
+
+
+def test_candidate_on_unchanged_traffic_is_swapped_in(analyzer):
+    current = analyzer.isolation_forest
+    analyzer.recent = np.random.default_rng(2).normal(size=(2000, FEATURE_COUNT))
+    retrainer = retrainer_for(analyzer)
+
+    assert retrainer.retrain()
+    assert retrainer.swaps == 1
+    assert analyzer.isolation_forest is not current
+
+
+def test_sustained_shift_is_eventually_adopted(analyzer):
+    current = analyzer.isolation_forest
+    retrainer = retrainer_for(analyzer)
+
+    for seed in (1, 2):
+        analyzer.recent = shifted(seed)
+        assert not retrainer.retrain()
+    assert retrainer.drift_streak == 2
+    assert analyzer.isolation_forest is current
+
+    analyzer.recent = shifted(3)
+    assert retrainer.retrain()
+    assert analyzer.isolation_forest is not current
+    assert retrainer.drift_streak == 0
+
+    # The adopted model is the new baseline: the same traffic is no longer drift
+    analyzer.recent = shifted(4)
+    assert retrainer.retrain()
+
+
+def test_shift_that_keeps_changing_is_not_adopted(analyzer):
+    current = analyzer.isolation_forest
+    retrainer = retrainer_for(analyzer)
+
+    for seed, loc in ((1, 4.0), (2, -4.0), (3, 4.0)):
+        analyzer.recent = shifted(seed, loc)
+        assert not retrainer.retrain()
+        assert retrainer.drift_streak == 1
+    assert analyzer.isolation_forest is current
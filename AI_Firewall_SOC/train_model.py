@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Offline training: fit the anomaly model on exported flow features
+
+Usage:
+    python3 train_model.py [--data flow_features] [--days 7] [--out models/flow_model.pkl]
+
+Reads every feature segment written by feature_export.FlowFeatureWriter
+in the last N days, fits an IsolationForest and saves a model artifact
+that AIAnalyzer loads at startup.
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from config import FEATURE_EXPORT_DIR, MODEL_PATH
+from feature_export import load_features
+from model_artifact import save_model, training_stats
+
+try:
+    from sklearn.ensemble import IsolationForest
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+
+def train(features, contamination=0.1, max_rows=None, seed=42):
+    """Fit an IsolationForest on a feature matrix"""
+    features = features[np.isfinite(features).all(axis=1)]
+    if max_rows and len(features) > max_rows:
+        rng = np.random.default_rng(seed)
+        features = features[rng.choice(len(features), max_rows, replace=False)]
+    model = IsolationForest(contamination=contamination, random_state=seed, n_jobs=-1)
+    model.fit(features)
+    return model, features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the flow anomaly model offline")
+    parser.add_argument("--data", default=FEATURE_EXPORT_DIR or "flow_features")
+    parser.add_argument("--days", type=float, default=7, help="Use segments from the last N days")
+    parser.add_argument("--out", default=MODEL_PATH or "models/flow_model.pkl")
+    parser.add_argument("--contamination", type=float, default=0.1)
+    parser.add_argument("--max-rows", type=int, default=5000000,
+                        help="Subsample to at most this many vectors")
+    args = parser.parse_args()
+
+    if not SKLEARN_AVAILABLE:
+        print("scikit-learn not installed. Run: pip3 install scikit-learn")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    since = time.time() - args.days * 86400 if args.days else None
+    features = load_features(args.data, since)
+    print(f"Loaded {len(features)} feature vectors from {args.data} "
+          f"in {time.perf_counter() - start:.1f}s")
+    if len(features) <= 20:
+        print("Not enough data to train")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    model, used = train(features, args.contamination, args.max_rows)
+    seconds = time.perf_counter() - start
+    print(f"Trained on {len(used)} vectors in {seconds:.1f}s")
+
+    stats = training_stats(model, used, seconds)
+    print(f"Training anomaly rate: {stats['anomaly_rate']:.1%}")
+    save_model(args.out, model, stats, source=args.data, days=args.days)
+    print(f"Saved model to {args.out}")
+
+
+if __name__ == "__main__":
+    main()